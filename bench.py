@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+benchmarks for metal.py
+
+usage: python bench.py [--quick] [--filter TEXT] [--save FILE]
+                       [--baseline FILE] [--threshold RATIO] [-n COUNT]
+
+every case also records a fingerprint of its results, comparing against a
+baseline flags both slowdowns and any change in rounding or formatting;
+--quick rounds are too short for stable timings, so they only compare
+fingerprints
+"""
+import argparse
+import atexit
+import hashlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import metal
+from metal import Metal
+from metal import RangeMetal
+
+
+def _fingerprint(result):
+    if isinstance(result, list):
+        text = '\n'.join(str(r) for r in result)
+    else:
+        text = str(result)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+def _measure(func, min_time, rounds=7):
+    # calibrate the loop count, then take the best of the rounds, other
+    # load on the machine only ever slows a round down
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / rounds:
+            break
+        loops *= 4
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        times.append(time.perf_counter() - start)
+    return loops / min(times)
+
+
+def _peak_allocation(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _long_expr(terms):
+    return ' + '.join(['2.33ref1rec * 3', '(5scrap - 1wep) / 2'] * (terms // 2))
+
+
+def _nested_expr(depth):
+    return '(' * depth + '1.33ref' + ' + 1rec) / 2 + 1scrap' * depth
+
+
+def _grid(step, stop):
+    values = []
+    value = 0
+    while value <= stop:
+        values.append('{:.2f}'.format(value / 100))
+        value += step
+    return values
+
+
+# a new interpreter reads the file back, so the 'metal' dtype must be
+# registered by importing metal alone
+_COLD_READ = 'import sys, pandas, metal; print(pandas.read_parquet(sys.argv[1])["price"].sum())'
+
+
+def _pandas_cases():
+    try:
+        import pandas as pd
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return
+    metal.register_pandas()
+    prices = pd.Series(metal.price_grid(1000, '0.11ref') * 10, dtype='metal')
+    items = pd.Series(range(len(prices))) % 100
+    texts = pd.Series(prices.array.strfref('%r ref'))
+    fd, path = tempfile.mkstemp(suffix='.parquet')
+    os.close(fd)
+    atexit.register(os.remove, path)
+    pd.DataFrame({'price': prices}).to_parquet(path)
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(metal.__file__)))
+    yield 'pandas/parse', lambda: texts.astype('metal').sum()
+    yield 'pandas/strfref', lambda: prices.array.strfref('%r ref')[-1]
+    yield 'pandas/groupby-sum', lambda: prices.groupby(items).sum().tolist()
+    yield 'pandas/sort', lambda: prices.sort_values().iloc[-1]
+    yield 'pandas/parquet-cold', lambda: subprocess.run(
+        [sys.executable, '-c', _COLD_READ, path], env=env, check=True, capture_output=True, text=True
+    ).stdout
+
+
+def cases():
+    a = Metal('12.55')
+    b = Metal('3.66')
+    r = RangeMetal(Metal('1.33'), Metal('2.66'))
+    r2 = RangeMetal(Metal('0.55'), Metal('0.77'))
+    metals = [Metal(scrap=i % 50, weapon=i % 2) for i in range(1000)]
+    short = '2.33ref * 3'
+    long = _long_expr(200)
+    nested = _nested_expr(60)
+    grid = _grid(1, 1000)
+
+    yield 'init/ref', lambda: Metal(ref='2.33')
+    yield 'init/ref-rec', lambda: Metal(ref='2.33', rec='1')
+    yield 'init/scrap', lambda: Metal(scrap='3')
+    yield 'init/weapon', lambda: Metal(weapon='5')
+    yield 'init/all', lambda: Metal('12.55', '0.66', '1.5', '3')
+    yield 'init/inf', lambda: Metal('inf')
+    yield 'arith/chain', lambda: (a * 3 + b - a / 2) * '1.5' - b / 7
+    yield 'arith/ratio', lambda: a / b
+    yield 'arith/sum-1000', lambda: sum(metals, Metal())
+    yield 'arith/compare', lambda: (a < b, a == b, a >= b)
+    for directive in 'wWsScCrR':
+        yield 'strfref/%' + directive, lambda d=directive: a.strfref('%' + d)
+    yield 'strfref/price', lambda: a.strfref('%r ref')
+    yield 'range/init', lambda: RangeMetal(a, b)
+    yield 'range/add', lambda: r + r2
+    yield 'range/mul', lambda: r * 3
+    yield 'range/div-number', lambda: r / 2
+    yield 'range/div-metal', lambda: r / b
+    yield 'range/div-range', lambda: r / r2
+    yield 'range/steps', lambda: list(r.steps())
+    yield 'range/grid', lambda: metal.price_grid(100)
+    for name, expr in (('short', short), ('long', long), ('nested', nested)):
+        tokens = metal.lex(expr)
+        node = metal.parse(tokens)
+        yield 'parse/lex-' + name, lambda e=expr: len(metal.lex(e))
+        yield 'parse/parse-' + name, lambda t=tokens: metal.parse(t)
+        yield 'parse/evaluate-' + name, lambda n=node: metal.evaluate(n)
+        yield 'parse/calc-' + name, lambda e=expr: metal.compile(e).evaluate()
+    yield 'parse/calc-cached', lambda: metal.calc(short)
+    # rounding fingerprints over whole input grids
+    yield 'rounding/ref', lambda: [Metal(ref=v).strfref('%r %w') for v in grid]
+    yield 'rounding/rec', lambda: [Metal(rec=v).strfref('%c %w') for v in grid]
+    yield 'rounding/scrap', lambda: [Metal(scrap=v).strfref('%s %w') for v in grid]
+    yield 'rounding/mul', lambda: [(a * v).strfref('%w') for v in grid[::10]]
+    yield 'rounding/div', lambda: [(a / v).strfref('%w') for v in grid[1::10]]
+    yield from _pandas_cases()
+
+
+def run(name_filter=None, quick=False, names=None):
+    min_time = 0.05 if quick else 0.4
+    results = {}
+    for name, func in cases():
+        if name_filter and name_filter not in name:
+            continue
+        if names is not None and name not in names:
+            continue
+        ops = _measure(func, min_time)
+        peak = _peak_allocation(func)
+        results[name] = {
+            'ops_per_sec': ops,
+            'peak_bytes': peak,
+            'fingerprint': _fingerprint(func())
+        }
+        print(f'{name:24} {ops:14,.0f} ops/s {peak:10,d} B allocated')
+    return results
+
+
+def remeasure(results, baseline, threshold, attempts=2):
+    # a real slowdown stays slow when measured again, other load on the
+    # machine does not, so slow cases keep their best measurement
+    for _ in range(attempts):
+        slow = {
+            name for name, result in results.items()
+            if name in baseline and result['ops_per_sec'] / baseline[name]['ops_per_sec'] < 1 - threshold
+        }
+        if not slow:
+            return
+        print(f'measuring {len(slow)} slower cases again')
+        for name, result in run(names=slow).items():
+            results[name]['ops_per_sec'] = max(results[name]['ops_per_sec'], result['ops_per_sec'])
+
+
+def compare(results, baseline, threshold, timings=True):
+    failed = False
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        if result['fingerprint'] != old['fingerprint']:
+            print(f'RESULT CHANGED  {name}')
+            failed = True
+        if not timings:
+            continue
+        ratio = result['ops_per_sec'] / old['ops_per_sec']
+        if ratio < 1 - threshold:
+            print(f'REGRESSION      {name:24} {ratio:6.2f}x')
+            failed = True
+        elif ratio > 1 + threshold:
+            print(f'faster          {name:24} {ratio:6.2f}x')
+    return failed
+
+
+def bench_sum(n):
+    # full Metal() parsing per step against the trusted constructor
+    metals = [Metal(scrap=i % 50, weapon=i % 2) for i in range(n)]
+    start = time.perf_counter()
+    total = Metal()
+    for m in metals:
+        total = Metal(scrap=total.scrap + m.scrap)
+    full_time = time.perf_counter() - start
+    start = time.perf_counter()
+    fast = sum(metals, Metal())
+    fast_time = time.perf_counter() - start
+    assert total == fast
+    print(f'sum of {n} Metals')
+    print(f'  Metal() per step          {full_time:8.3f}s')
+    print(f'  Metal._from_weapon        {fast_time:8.3f}s')
+    print(f'  speedup                   {full_time / fast_time:8.1f}x')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='metal.py benchmarks')
+    parser.add_argument('--quick', action='store_true', help='shorter timing rounds')
+    parser.add_argument('--filter', help='only run cases whose name contains TEXT')
+    parser.add_argument('--save', help='write results to a JSON file')
+    parser.add_argument('--baseline', help='compare against a saved JSON file')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown ratio (default 0.2)')
+    parser.add_argument('-n', type=int, help='only run the sum benchmark over COUNT Metals')
+    args = parser.parse_args()
+    if args.n:
+        bench_sum(args.n)
+        return 0
+    results = run(args.filter, args.quick)
+    if args.save:
+        data = {
+            'version': metal.__version__,
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'results': results
+        }
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        if not args.quick:
+            remeasure(results, baseline, args.threshold)
+        if compare(results, baseline, args.threshold, timings=not args.quick):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
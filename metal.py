@@ -1,24 +1,46 @@
 # -*- coding: utf-8 -*-
+from array import array
+from bisect import bisect_left
+from bisect import bisect_right
+from collections import Counter
 from collections import OrderedDict
+from collections import namedtuple
+from collections.abc import Mapping
+from collections.abc import MutableMapping
+from contextlib import contextmanager
 import decimal
 from decimal import Decimal as D
 from decimal import ROUND_DOWN
+from functools import lru_cache
+from functools import wraps
 import re
 import sys
+import threading
+from time import perf_counter
+import weakref
 
 __version__ = '2.0.0'
 
 EXCHANGE_RATE = None
 
-decimal.setcontext(decimal.ExtendedContext)
-decimal.getcontext().prec = 18
+# every Decimal operation runs in this context, the caller's context is
+# left alone
+_context = decimal.ExtendedContext.copy()
+_context.prec = 18
+
+# optional dependencies, imported on first use
+np = None
+colorama = None
+COLOR = False
+
+
+def _decimal_context(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with decimal.localcontext(_context):
+            return func(*args, **kwargs)
+    return wrapper
 
-try:
-    import colorama
-    colorama.init()
-    COLOR = True
-except ImportError:
-    COLOR = False
 
 operations = OrderedDict([
     ("+", lambda x, y: x + y),
@@ -29,62 +51,113 @@ operations = OrderedDict([
 
 symbols = operations.keys()
 
+precedences = {
+    '+': 1,
+    '-': 1,
+    '/': 2,
+    '*': 2
+}
+
+unary_operations = {
+    '+': lambda x: +x,
+    '-': lambda x: -x if isinstance(x, Metal) else D('0') - x
+}
+
+units = {
+    'ref': 'ref',
+    'refined': 'ref',
+    'rec': 'rec',
+    'reclaimed': 'rec',
+    'scrap': 'scrap',
+    'wep': 'weapon',
+    'weapon': 'weapon',
+    'key': 'key',
+    'keys': 'key'
+}
+
+NUMBER = 'number'
+UNIT = 'unit'
+OPERATOR = 'operator'
+PAREN = 'paren'
+
+Token = namedtuple('Token', ['kind', 'value', 'pos'])
+BinOp = namedtuple('BinOp', ['op', 'left', 'right'])
+UnaryOp = namedtuple('UnaryOp', ['op', 'operand'])
+KeyPrice = namedtuple('KeyPrice', ['keys', 'metal'])
+Var = namedtuple('Var', ['name', 'pos'])
+
+_token_re = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<operator>[-+*/])
+  | (?P<paren>[()])
+  | (?P<number>[\d.](?:\s*[\d.])*)
+  | (?P<unit>[^-+*/()\d.\s](?:\s*[^-+*/()\d.\s])*)
+""", re.VERBOSE)
+_number_re = re.compile(r'\d+\.?\d*|\.\d+')
+
 
 class Metal:
 
-    __scrap = None
-
-    def __init__(self, ref='0', rec='0', scrap='0', weapon='0'):
-        # init with 0 metal
-        self.__scrap = D('0')
-        # init infinity
-        all_currency = (D(ref), D(rec), D(scrap), D(weapon))
-        if D('inf') in all_currency:
-            self.__scrap += D('inf')
-        if D('-inf') in all_currency:
-            self.__scrap += D('-inf')
-        if self.__scrap == D('NaN') or D('NaN') in all_currency:
-            raise ValueError('Metal can not be NaN')
-        if self.__scrap != D('0'):
-            return
-        # load weapon arg
-        weapon = D(weapon).quantize(D('1'), rounding=ROUND_DOWN)
-        # put 0.5 scrap per weapon into metal storage
-        self.__scrap += weapon / D('2')
-        # load scrap arg, rounding to 0.5 scrap
-        scrap = (D(scrap) * D('2')).quantize(D('1')) / D('2')
-        # put scrap into storage
-        self.__scrap += scrap
-        # rec3 stands for reclaimed rounding to 0.33
-        rec3 = ((D(rec) * D('3')).quantize(D('1')) / D('3')).quantize(D('.01'), rounding=ROUND_DOWN)
-        # rec9 stands for reclaimed rounding to 0.11
-        rec9 = ((D(rec) * D('9')).quantize(D('1')) / D('9')).quantize(D('.01'), rounding=ROUND_DOWN)
-        # put integer part of rec3 into storage, 3 scrap per reclaimed
-        self.__scrap += D('3') * (rec3 // D('1'))
-        # put decimal part of rec3 into storage, 1 scrap per 0.33 reclaimed
-        self.__scrap += rec3 % D('1') // D('0.33')
-        # adjust storage with 0.5 scrap, that's the part of reclaimed over 0.33
-        if rec9 > rec3:
-            self.__scrap += D('0.5')
-        if rec9 < rec3:
-            self.__scrap -= D('0.5')
-        # ref9 stands for refined rounding to 0.11
-        ref9 = ((D(ref) * D('9')).quantize(D('1')) / D('9')).quantize(D('.01'), rounding=ROUND_DOWN)
-        # ref18 stands for refined rounding to 0.05
-        ref18 = ((D(ref) * D('18')).quantize(D('1')) / D('18')).quantize(D('.01'), rounding=ROUND_DOWN)
-        # put integer part of ref9 into storage, 9 scrap per refined
-        self.__scrap += D('9') * (ref9 // D('1'))
-        # put decimal part of ref9 into storage, 1 scrap per 0.11 reclaimed
-        self.__scrap += ref9 % D('1') // D('0.11')
-        # adjust storage with 0.5 scrap, that's the part of refined over 0.11
-        if ref18 > ref9:
-            self.__scrap += D('0.5')
-        if ref18 < ref9:
-            self.__scrap -= D('0.5')
+    # metal value is stored as an exact count of weapons (half scrap),
+    # an int for finite values or a float infinity; __scrap is only set
+    # when the constructor arguments leave a Decimal form other than the
+    # canonical one, e.g. 29.0
+    __slots__ = ('__weapon', '__scrap')
+
+    def __new__(cls, ref='0', rec='0', scrap='0', weapon='0'):
+        weapon, scrap = _parse_weapon(ref, rec, scrap, weapon)
+        if scrap is None:
+            return cls._from_weapon(weapon)
+        # never shared, the scrap form belongs to this value only
+        self = object.__new__(cls)
+        _set_weapon(self, weapon)
+        _set_scrap(self, scrap)
+        return self
+
+    @classmethod
+    def _from_weapon(cls, weapon):
+        # trusted constructor for values that are already a weapon count,
+        # skips all parsing and rounding, small values are shared
+        if -_intern_limit <= weapon <= _intern_limit and cls is Metal:
+            self = _interned.get(weapon)
+            if self is None:
+                self = object.__new__(cls)
+                _set_weapon(self, weapon)
+                self = _interned.setdefault(weapon, self)
+            return self
+        self = object.__new__(cls)
+        _set_weapon(self, weapon)
+        return self
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{self.__class__.__name__} is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError(f'{self.__class__.__name__} is immutable')
+
+    def __reduce__(self):
+        try:
+            return _unpickle_metal, (self.__weapon, str(self.__scrap))
+        except AttributeError:
+            return _unpickle_metal, (self.__weapon,)
+
+    def sort_key(self):
+        """
+        cheap sort and grouping key, the weapon count: an int for finite
+        values, infinities sort after or before every int
+        """
+        return self.__weapon
+
+    @property
+    def weapon(self):
+        return self.__weapon
 
     @property
     def scrap(self):
-        return self.__scrap
+        try:
+            return self.__scrap
+        except AttributeError:
+            return _weapon_scrap(self.__weapon)
 
     def strfref(self, fmt):
         """
@@ -100,83 +173,50 @@ class Metal:
         %R - refined amount in normalize form
         %% - % character
         """
-        scrap = self.__scrap
+        weapon = self.__weapon
+        if -_residue_limit < weapon < _residue_limit:
+            # sign + whole part + residue suffix, see _strfref_residues
+            sign = ''
+            if weapon < 0:
+                sign = '-'
+                weapon = -weapon
+            return ''.join([
+                part if part.__class__ is str else sign + str(part[0](weapon)) + part[2][weapon % part[1]]
+                for part in _compile_residues(fmt)
+            ])
+        template = _compile_strfref(fmt)
+        scrap = self.scrap
         if scrap.is_infinite():
-            ref_w = ref_W = scrap
-            ref_s = ref_S = scrap
-            ref_c = ref_C = scrap
-            ref_r = ref_R = scrap
-        else:
-            ref_w = (scrap * D('2')).quantize(D('1'))
-            ref_W = (scrap % D('1') * D('2')).quantize(D('1'))
-            ref_s = scrap.quantize(D('.1'))
-            ref_S = (scrap % D('3')).quantize(D('1'), rounding=ROUND_DOWN)
-            ref_c = (scrap // D('3') + ref_S * D('0.33') + ref_W * D('0.16')).quantize(D('.01'))
-            ref_C = (scrap % D('9') // D('3')).quantize(D('.01'))
-            ref_r = (scrap // D('9') + ref_C * D('0.33') + ref_S * D('0.11') + ref_W * D('0.05')).quantize(D('.01'))
-            ref_R = (scrap // D('9')).quantize(D('.01'))
-        i = 0
-        n = len(fmt)
-        output = list()
-        push = output.append
-        while i < n:
-            char = fmt[i]
-            i += 1
-            if char == '%':
-                if i < n:
-                    char = fmt[i]
-                    i += 1
-                    if char == 'w':
-                        push(str(normalize(ref_w)))
-                    elif char == 'W':
-                        push(str(normalize(ref_W)))
-                    elif char == 's':
-                        push(str(normalize(ref_s)))
-                    elif char == 'S':
-                        push(str(normalize(ref_S)))
-                    elif char == 'c':
-                        push(str(normalize(ref_c)))
-                    elif char == 'C':
-                        push(str(normalize(ref_C)))
-                    elif char == 'r':
-                        push(str(normalize(ref_r)))
-                    elif char == 'R':
-                        push(str(normalize(ref_R)))
-                    elif char == '%':
-                        push('%')
-                    else:
-                        push('%')
-                        push(char)
-                else:
-                    push('%')
-            else:
-                push(char)
-        output = ''.join(output)
-        return output
+            value = str(normalize(scrap))
+            return ''.join(part if part.__class__ is str else value for part in template)
+        with decimal.localcontext(_context):
+            return ''.join(part if part.__class__ is str else part(scrap) for part in template)
 
     def __str__(self):
         return self.strfref('%r ref')
 
     def __repr__(self):
+        if self.__weapon < 0:
+            ref = (-self).strfref('%r')
+            return f'-Metal({ref})'
         ref = self.strfref('%r')
-        if self.__scrap < 0:
-            return f'-Metal({-ref})'
         return f'Metal({ref})'
 
     def __neg__(self):
-        data = -(self.__scrap)
-        return Metal(scrap=data)
+        return Metal._from_weapon(-self.__weapon)
 
     def __pos__(self):
-        return Metal(scrap=self.__scrap)
+        return Metal._from_weapon(self.__weapon)
 
     def __abs__(self):
-        return Metal(scrap=abs(self.__scrap))
+        return Metal._from_weapon(abs(self.__weapon))
 
     def __add__(self, other):
         if _is_single_metal(other):
-            scrap = self.__scrap + other.scrap
-            return Metal(scrap=scrap)
+            weapon = self.__weapon + other.__weapon
+            if weapon != weapon:
+                raise ValueError('Metal can not be NaN')
+            return Metal._from_weapon(weapon)
         return NotImplemented
 
     def __radd__(self, other):
@@ -189,9 +229,11 @@ class Metal:
         return -self.__sub__(other)
 
     def __mul__(self, other):
+        if other.__class__ is int and self.__weapon.__class__ is int:
+            return Metal._from_weapon(self.__weapon * other)
         if _is_number(other):
-            scrap = self.__scrap * D(other)
-            return Metal(scrap=scrap)
+            weapon = _weapon_count(_context.multiply(D(self.__weapon, _context), D(other, _context)))
+            return Metal._from_weapon(weapon)
         return NotImplemented
 
     def __rmul__(self, other):
@@ -199,13 +241,15 @@ class Metal:
 
     def __truediv__(self, other):
         if _is_single_metal(other):
-            data = self.__scrap / other.scrap
+            data = _context.divide(D(self.__weapon, _context), D(other.__weapon, _context))
             if data.is_finite():
-                data = normalize(data.quantize(D('.01')))
+                data = normalize(data.quantize(D('.01'), context=_context))
             return data
+        elif other.__class__ is int and other and self.__weapon.__class__ is int:
+            return Metal._from_weapon(_div_half_even(self.__weapon, other))
         elif _is_number(other):
-            scrap = self.__scrap / D(other)
-            return Metal(scrap=scrap)
+            weapon = _weapon_count(_context.divide(D(self.__weapon, _context), D(other, _context)))
+            return Metal._from_weapon(weapon)
         return NotImplemented
 
     def __rtruediv__(self, other):
@@ -215,36 +259,56 @@ class Metal:
 
     def __eq__(self, other):
         if _is_single_metal(other):
-            return self.__scrap == other.scrap
+            return self.__weapon == other.__weapon
         return NotImplemented
 
     def __ne__(self, other):
         if _is_single_metal(other):
-            return self.__scrap != other.scrap
+            return self.__weapon != other.__weapon
         return NotImplemented
 
     def __ge__(self, other):
         if _is_single_metal(other):
-            return self.__scrap >= other.scrap
+            return self.__weapon >= other.__weapon
         return NotImplemented
 
     def __le__(self, other):
         if _is_single_metal(other):
-            return self.__scrap <= other.scrap
+            return self.__weapon <= other.__weapon
         return NotImplemented
 
     def __gt__(self, other):
         if _is_single_metal(other):
-            return self.__scrap > other.scrap
+            return self.__weapon > other.__weapon
         return NotImplemented
 
     def __lt__(self, other):
         if _is_single_metal(other):
-            return self.__scrap < other.scrap
+            return self.__weapon < other.__weapon
         return NotImplemented
 
+    def __hash__(self):
+        return hash(self.__weapon)
+
     def __bool__(self):
-        return self.__scrap != D('0')
+        return self.__weapon != 0
+
+
+_get_weapon = Metal._Metal__weapon.__get__
+_set_weapon = Metal._Metal__weapon.__set__
+_set_scrap = Metal._Metal__scrap.__set__
+
+
+def _weapon_scrap(weapon):
+    # canonical scrap Decimal of a weapon count
+    if isinstance(weapon, float):
+        return D(weapon, _context)
+    return _context.divide(D(weapon), D('2'))
+
+
+# values within _intern_limit weapons of zero share one instance each
+_intern_limit = 1800
+_interned = {}
 
 
 class RangeMetal(Metal):
@@ -258,14 +322,13 @@ class RangeMetal(Metal):
             raise TypeError('RangeMetal accepts Metal arguments only')
         if start == end:
             return start
-        return super().__new__(cls)
+        return object.__new__(cls)
 
     def __init__(self, start, end):
         if start > end:
             start, end = end, start
-        self.__start = start
-        self.__end = end
-        self.__median = (start + end) / D('2')
+        object.__setattr__(self, '_RangeMetal__start', start)
+        object.__setattr__(self, '_RangeMetal__end', end)
 
     @property
     def start(self):
@@ -277,15 +340,24 @@ class RangeMetal(Metal):
 
     @property
     def median(self):
+        if self.__median is None:
+            object.__setattr__(self, '_RangeMetal__median', (self.__start + self.__end) / 2)
         return self.__median
 
     @property
     def scrap(self):
         raise NotImplementedError('RangeMetal does not support scrap property')
 
+    @property
+    def weapon(self):
+        raise NotImplementedError('RangeMetal does not support weapon property')
+
     def strfref(self, *args, **kwargs):
         raise NotImplementedError('RangeMetal does not support formatting string')
 
+    def sort_key(self):
+        raise NotImplementedError('RangeMetal does not support sort key')
+
     def __str__(self):
         start = self.__start.strfref('%r')
         end = self.__end.strfref('%r')
@@ -300,6 +372,15 @@ class RangeMetal(Metal):
         yield self.__start
         yield self.__end
 
+    def steps(self, step=None, fmt=None):
+        """
+        lazily walk the range from start up to end in steps of step, one
+        weapon by default, as a Metal or a literal like '0.11ref' (bare
+        numbers are refined); yields Metal values, or strfref(fmt) strings
+        when fmt is given
+        """
+        return _weapon_steps(self.__start, self.__end, step, fmt)
+
     def __neg__(self):
         return RangeMetal(-self.__end, -self.__start)
 
@@ -322,11 +403,12 @@ class RangeMetal(Metal):
 
     def __mul__(self, other):
         if _is_number(other):
-            start = self.__start * D(other)
-            end = self.__end * D(other)
+            start = self.__start * other
+            end = self.__end * other
             return RangeMetal(start, end)
         return NotImplemented
 
+    @_decimal_context
     def __truediv__(self, other):
         if _is_single_metal(other):
             start = self.__start / other
@@ -357,11 +439,12 @@ class RangeMetal(Metal):
                 return start
             return (start, end)
         elif _is_number(other):
-            start = self.__start / D(other)
-            end = self.__end / D(other)
+            start = self.__start / other
+            end = self.__end / other
             return RangeMetal(start, end)
         return NotImplemented
 
+    @_decimal_context
     def __rtruediv__(self, other):
         if _is_single_metal(other):
             start = other / self.__start
@@ -391,6 +474,12 @@ class RangeMetal(Metal):
     def __ne__(self, other):
         return not self.__eq__(other)
 
+    def __hash__(self):
+        return hash((self.__start, self.__end))
+
+    def __reduce__(self):
+        return _unpickle_range, (self.__start.weapon, self.__end.weapon)
+
     def __ge__(self, other):
         return NotImplemented
 
@@ -407,11 +496,865 @@ class RangeMetal(Metal):
         return True
 
 
+class MetalArray:
+
+    # many metal values as one read-only int64 numpy array of weapons,
+    # infinite values can not be stored
+
+    __array_ufunc__ = None
+
+    def __init__(self, metals=()):
+        _import_numpy()
+        weapons = []
+        for m in metals:
+            if not _is_single_metal(m):
+                raise TypeError('MetalArray accepts Metal values only')
+            weapons.append(m.weapon)
+        self.__weapons = _weapon_array(weapons)
+
+    @classmethod
+    def from_weapons(cls, weapons):
+        _import_numpy()
+        self = object.__new__(cls)
+        self.__weapons = _weapon_array(weapons)
+        return self
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        read to_bytes() output, the array shares memory with data on
+        little-endian hosts
+        """
+        _import_numpy()
+        self = object.__new__(cls)
+        self.__weapons = _wire_array(data)
+        return self
+
+    def to_bytes(self):
+        return _wire_bytes(self.__weapons)
+
+    def __reduce__(self):
+        return self.__class__.from_bytes, (self.to_bytes(),)
+
+    @property
+    def weapons(self):
+        return self.__weapons
+
+    def tolist(self):
+        return [Metal._from_weapon(w) for w in self.__weapons.tolist()]
+
+    def strfref(self, fmt):
+        weapons = self.__weapons
+        absolute = np.abs(weapons)
+        sign = np.where(weapons < 0, '-', '').astype(object)
+        output = np.full(len(weapons), '', dtype=object)
+        for part in _compile_strfref(fmt):
+            if part.__class__ is str:
+                output += part
+                continue
+            whole, modulus, suffixes = _strfref_residues[_strfref_keys[part]]
+            output += sign + whole(absolute).astype(str).astype(object)
+            if modulus > 1:
+                output += np.array(suffixes, dtype=object)[absolute % modulus]
+        return output.tolist()
+
+    def __len__(self):
+        return len(self.__weapons)
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            return Metal._from_weapon(int(self.__weapons[key]))
+        return MetalArray.from_weapons(self.__weapons[key])
+
+    def __str__(self):
+        values = ', '.join(self.strfref('%r'))
+        return f'[{values}] ref'
+
+    def __repr__(self):
+        values = ', '.join(self.strfref('%r'))
+        return f'MetalArray([{values}])'
+
+    def sum(self):
+        return Metal._from_weapon(int(self.__weapons.sum()))
+
+    def min(self):
+        return Metal._from_weapon(int(self.__weapons.min()))
+
+    def max(self):
+        return Metal._from_weapon(int(self.__weapons.max()))
+
+    def argsort(self, kind='stable'):
+        return self.__weapons.argsort(kind=kind)
+
+    def __neg__(self):
+        return MetalArray.from_weapons(-self.__weapons)
+
+    def __pos__(self):
+        return MetalArray.from_weapons(self.__weapons)
+
+    def __abs__(self):
+        return MetalArray.from_weapons(np.abs(self.__weapons))
+
+    def __add__(self, other):
+        other = _other_weapons(other)
+        if other is None:
+            return NotImplemented
+        return MetalArray.from_weapons(self.__weapons + other)
+
+    def __radd__(self, other):
+        return self.__add__(other)
+
+    def __sub__(self, other):
+        other = _other_weapons(other)
+        if other is None:
+            return NotImplemented
+        return MetalArray.from_weapons(self.__weapons - other)
+
+    def __rsub__(self, other):
+        other = _other_weapons(other)
+        if other is None:
+            return NotImplemented
+        return MetalArray.from_weapons(other - self.__weapons)
+
+    def __mul__(self, other):
+        factors = _int_factors(other)
+        if factors is not None:
+            return MetalArray.from_weapons(_scale_weapons(self.__weapons, factors, 1))
+        if isinstance(other, (Metal, MetalArray)) or not _is_number(other):
+            return NotImplemented
+        num, den = _number_ratio(other)
+        return MetalArray.from_weapons(_scale_weapons(self.__weapons, num, den))
+
+    def __rmul__(self, other):
+        return self.__mul__(other)
+
+    def __truediv__(self, other):
+        factors = _int_factors(other)
+        if factors is not None:
+            if not factors.all():
+                raise ZeroDivisionError('MetalArray division by zero')
+            return MetalArray.from_weapons(_div_half_even_array(self.__weapons, factors))
+        if isinstance(other, (Metal, MetalArray)) or not _is_number(other):
+            return NotImplemented
+        num, den = _number_ratio(other)
+        if not num:
+            raise ZeroDivisionError('MetalArray division by zero')
+        return MetalArray.from_weapons(_scale_weapons(self.__weapons, den, num))
+
+    def __eq__(self, other):
+        other = _other_weapons(other)
+        if other is None:
+            return NotImplemented
+        return self.__weapons == other
+
+    def __ne__(self, other):
+        other = _other_weapons(other)
+        if other is None:
+            return NotImplemented
+        return self.__weapons != other
+
+    def __ge__(self, other):
+        other = _other_weapons(other)
+        if other is None:
+            return NotImplemented
+        return self.__weapons >= other
+
+    def __le__(self, other):
+        other = _other_weapons(other)
+        if other is None:
+            return NotImplemented
+        return self.__weapons <= other
+
+    def __gt__(self, other):
+        other = _other_weapons(other)
+        if other is None:
+            return NotImplemented
+        return self.__weapons > other
+
+    def __lt__(self, other):
+        other = _other_weapons(other)
+        if other is None:
+            return NotImplemented
+        return self.__weapons < other
+
+
+class RangeMetalArray:
+
+    # many ranges as two int64 columns of weapons, start <= end row by row;
+    # rows with start == end collapse to Metal when read back
+
+    __array_ufunc__ = None
+
+    def __init__(self, ranges=()):
+        _import_numpy()
+        starts = []
+        ends = []
+        for r in ranges:
+            if isinstance(r, RangeMetal):
+                start, end = r
+            elif _is_single_metal(r):
+                start = end = r
+            elif isinstance(r, tuple) and len(r) == 2 and _is_single_metal(r[0]) and _is_single_metal(r[1]):
+                start, end = r
+                if start > end:
+                    start, end = end, start
+            else:
+                raise TypeError('RangeMetalArray accepts RangeMetal or Metal values only')
+            starts.append(start.weapon)
+            ends.append(end.weapon)
+        self.__init_columns(_weapon_array(starts), _weapon_array(ends))
+
+    @classmethod
+    def from_weapons(cls, starts, ends):
+        _import_numpy()
+        self = object.__new__(cls)
+        self.__init_columns(_weapon_array(starts), _weapon_array(ends))
+        return self
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        read ranges_to_bytes() output
+        """
+        _import_numpy()
+        pairs = _wire_array(data)
+        if len(pairs) % 2:
+            raise ValueError('Wire data must be a whole number of ranges')
+        pairs = pairs.reshape(-1, 2)
+        self = object.__new__(cls)
+        self.__init_columns(_weapon_array(pairs[:, 0]), _weapon_array(pairs[:, 1]))
+        return self
+
+    def to_bytes(self):
+        return _wire_bytes(np.column_stack((self.__start.weapons, self.__end.weapons)))
+
+    def __reduce__(self):
+        return self.__class__.from_bytes, (self.to_bytes(),)
+
+    def __init_columns(self, starts, ends):
+        if len(starts) != len(ends):
+            raise ValueError('RangeMetalArray columns must have the same length')
+        swap = starts > ends
+        if swap.any():
+            starts, ends = _weapon_array(np.where(swap, ends, starts)), _weapon_array(np.where(swap, starts, ends))
+        self.__start = MetalArray.from_weapons(starts)
+        self.__end = MetalArray.from_weapons(ends)
+        self.__median = None
+
+    @property
+    def start(self):
+        return self.__start
+
+    @property
+    def end(self):
+        return self.__end
+
+    @property
+    def median(self):
+        if self.__median is None:
+            weapons = self.__start.weapons + self.__end.weapons
+            self.__median = MetalArray.from_weapons(_div_half_even_array(weapons, 2))
+        return self.__median
+
+    def tolist(self):
+        return [self[i] for i in range(len(self))]
+
+    def __len__(self):
+        return len(self.__start)
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            return RangeMetal(self.__start[key], self.__end[key])
+        return RangeMetalArray.from_weapons(self.__start.weapons[key], self.__end.weapons[key])
+
+    def __str__(self):
+        return '[{}]'.format(', '.join(str(r) for r in self))
+
+    def __repr__(self):
+        return 'RangeMetalArray([{}])'.format(', '.join(repr(r) for r in self))
+
+    def __neg__(self):
+        return RangeMetalArray.from_weapons(-self.__end.weapons, -self.__start.weapons)
+
+    def __pos__(self):
+        return self
+
+    def __add__(self, other):
+        columns = _range_columns(other)
+        if columns is None:
+            return NotImplemented
+        return RangeMetalArray.from_weapons(self.__start.weapons + columns[0], self.__end.weapons + columns[1])
+
+    def __radd__(self, other):
+        return self.__add__(other)
+
+    def __sub__(self, other):
+        columns = _range_columns(other)
+        if columns is None:
+            return NotImplemented
+        return RangeMetalArray.from_weapons(self.__start.weapons - columns[1], self.__end.weapons - columns[0])
+
+    def __rsub__(self, other):
+        return -self + other
+
+    def __mul__(self, other):
+        if isinstance(other, (Metal, MetalArray, RangeMetalArray)) or not _is_number(other):
+            return NotImplemented
+        return RangeMetalArray.from_weapons((self.__start * other).weapons, (self.__end * other).weapons)
+
+    def __rmul__(self, other):
+        return self.__mul__(other)
+
+    def __truediv__(self, other):
+        """
+        divided by a number, ranges are scaled; divided by metal, returns
+        (low, high) object arrays of Decimal ratios rounded to 0.01
+        """
+        if _is_number(other) and not isinstance(other, (Metal, MetalArray, RangeMetalArray)):
+            return RangeMetalArray.from_weapons((self.__start / other).weapons, (self.__end / other).weapons)
+        columns = _range_columns(other)
+        if columns is None:
+            return NotImplemented
+        starts = self.__start.weapons
+        ends = self.__end.weapons
+        low, high = columns
+        if low is high:
+            ratios = (_ratio_array(starts, low), _ratio_array(ends, low))
+        else:
+            ratios = (
+                _ratio_array(starts, low),
+                _ratio_array(starts, high),
+                _ratio_array(ends, low),
+                _ratio_array(ends, high)
+            )
+        return np.minimum.reduce(ratios), np.maximum.reduce(ratios)
+
+    def __eq__(self, other):
+        columns = _range_columns(other)
+        if columns is None:
+            return NotImplemented
+        return (self.__start.weapons == columns[0]) & (self.__end.weapons == columns[1])
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return equal
+        return ~equal
+
+
+class PriceList(MutableMapping):
+
+    # item to price mapping, prices with a key part are split into keys and
+    # metal once and only those are recomputed when the exchange rate moves
+
+    def __init__(self, prices=()):
+        self.__prices = {}
+        self.__keyed = {}
+        _price_lists[id(self)] = self
+        self.update(prices)
+
+    def __setitem__(self, item, price):
+        if not isinstance(price, (Metal, KeyPrice)):
+            tokens = list(tokenize(str(price)))
+            if not tokens or any(t.kind != NUMBER and t.kind != UNIT for t in tokens):
+                raise ParserError('Bad Currency')
+            price = _convert_literal(tokens)
+            if isinstance(price, D):
+                raise ParserError('Bad Currency')
+        if price.__class__ is KeyPrice:
+            self.__keyed[item] = price
+            self.__prices[item] = None
+            if EXCHANGE_RATE is not None:
+                self.__prices[item] = _key_price(price)
+        elif _is_single_metal(price):
+            self.__keyed.pop(item, None)
+            self.__prices[item] = price
+        else:
+            raise TypeError('PriceList accepts Metal prices only')
+
+    def __getitem__(self, item):
+        price = self.__prices[item]
+        if price is None:
+            raise ParserError('No Exchange Rate')
+        return price
+
+    def __delitem__(self, item):
+        del self.__prices[item]
+        self.__keyed.pop(item, None)
+
+    def __iter__(self):
+        return iter(self.__prices)
+
+    def __len__(self):
+        return len(self.__prices)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({len(self)} prices)'
+
+    def reprice(self):
+        prices = self.__prices
+        rate = EXCHANGE_RATE
+        if rate is None:
+            for item in self.__keyed:
+                prices[item] = None
+            return
+        rate = rate.weapon
+        for item, price in self.__keyed.items():
+            prices[item] = Metal._from_weapon(price.metal.weapon + _key_weapons(price.keys, rate))
+
+
+_price_lists = weakref.WeakValueDictionary()
+
+
+class MetalIndex:
+
+    # price to item multimap sorted by Metal.sort_key, items at one price
+    # keep their insertion order; entries live in buckets of at most
+    # 2 * _load, so an insert or delete bisects the bucket maxima and then
+    # shifts a single short list
+
+    _load = 512
+
+    def __init__(self, entries=()):
+        self.__keys = []
+        self.__entries = []
+        self.__maxes = []
+        self.__len = 0
+        self.__version = 0
+        entries = [_index_entry(price, item) for price, item in entries]
+        entries.sort(key=lambda entry: entry[0].sort_key())
+        for i in range(0, len(entries), self._load):
+            bucket = entries[i:i + self._load]
+            self.__entries.append(bucket)
+            self.__keys.append([price.sort_key() for price, _ in bucket])
+            self.__maxes.append(self.__keys[-1][-1])
+        self.__len = len(entries)
+
+    def __len__(self):
+        return self.__len
+
+    def __iter__(self):
+        return (entry for _, entry in self.__walk(0, 0, self.__version))
+
+    def __reversed__(self):
+        return (entry for _, entry in self.__walk_back(len(self.__keys), 0, self.__version))
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({len(self)} prices)'
+
+    def add(self, price, item):
+        entry = _index_entry(price, item)
+        key = price.sort_key()
+        maxes = self.__maxes
+        if not maxes:
+            self.__keys.append([key])
+            self.__entries.append([entry])
+            maxes.append(key)
+        else:
+            i = bisect_right(maxes, key)
+            if i == len(maxes):
+                i -= 1
+                maxes[i] = key
+            keys = self.__keys[i]
+            j = bisect_right(keys, key)
+            keys.insert(j, key)
+            self.__entries[i].insert(j, entry)
+            if len(keys) > 2 * self._load:
+                self.__split(i)
+        self.__len += 1
+        self.__version += 1
+
+    def update(self, entries):
+        for price, item in entries:
+            self.add(price, item)
+
+    def remove(self, price, item):
+        """
+        remove one (price, item) entry, raise KeyError if there is none
+        """
+        if not self.discard(price, item):
+            raise KeyError((price, item))
+
+    def discard(self, price, item):
+        _index_entry(price, item)
+        key = price.sort_key()
+        i = bisect_left(self.__maxes, key)
+        while i < len(self.__maxes):
+            keys = self.__keys[i]
+            entries = self.__entries[i]
+            j = bisect_left(keys, key)
+            while j < len(keys) and keys[j] == key:
+                if entries[j][1] == item:
+                    self.__delete(i, j)
+                    return True
+                j += 1
+            if j < len(keys):
+                break
+            i += 1
+        return False
+
+    def between(self, low, high=None):
+        """
+        iterate (price, item) entries with low <= price <= high in price
+        order, low can be a RangeMetal instead of both bounds
+        """
+        if isinstance(low, RangeMetal) and high is None:
+            low, high = low.start, low.end
+        elif high is None:
+            high = low
+        if not _is_single_metal(low) or not _is_single_metal(high):
+            raise TypeError('MetalIndex accepts Metal bounds only')
+        if low > high:
+            low, high = high, low
+        high = high.sort_key()
+        i, j = self.__position(low.sort_key())
+        for key, entry in self.__walk(i, j, self.__version):
+            if key > high:
+                return
+            yield entry
+
+    def nearest(self, price):
+        """
+        iterate (price, item) entries by distance from price, the lower
+        price first on ties
+        """
+        if not _is_single_metal(price):
+            raise TypeError('MetalIndex accepts Metal bounds only')
+        target = price.sort_key()
+        i, j = self.__position(target)
+        version = self.__version
+        up = self.__walk(i, j, version)
+        down = self.__walk_back(i, j, version)
+        above = next(up, None)
+        below = next(down, None)
+        while above is not None or below is not None:
+            if above is None or below is not None and _distance(below[0], target) <= _distance(above[0], target):
+                yield below[1]
+                below = next(down, None)
+            else:
+                yield above[1]
+                above = next(up, None)
+
+    def __position(self, key):
+        # bucket and offset of the first entry not below key
+        i = bisect_left(self.__maxes, key)
+        if i == len(self.__maxes):
+            return i, 0
+        return i, bisect_left(self.__keys[i], key)
+
+    def __walk(self, i, j, version):
+        # (key, entry) pairs upwards from position (i, j)
+        keys = self.__keys
+        entries = self.__entries
+        while i < len(keys):
+            while j < len(keys[i]):
+                if self.__version != version:
+                    raise RuntimeError('MetalIndex changed during iteration')
+                yield keys[i][j], entries[i][j]
+                j += 1
+            i += 1
+            j = 0
+
+    def __walk_back(self, i, j, version):
+        # (key, entry) pairs downwards from just below position (i, j)
+        keys = self.__keys
+        entries = self.__entries
+        while i >= 0:
+            while j > 0:
+                if self.__version != version:
+                    raise RuntimeError('MetalIndex changed during iteration')
+                j -= 1
+                yield keys[i][j], entries[i][j]
+            i -= 1
+            j = len(keys[i]) if i >= 0 else 0
+
+    def __split(self, i):
+        keys = self.__keys[i]
+        entries = self.__entries[i]
+        half = len(keys) // 2
+        self.__keys[i:i + 1] = [keys[:half], keys[half:]]
+        self.__entries[i:i + 1] = [entries[:half], entries[half:]]
+        self.__maxes[i:i + 1] = [keys[half - 1], keys[-1]]
+
+    def __delete(self, i, j):
+        keys = self.__keys[i]
+        del keys[j]
+        del self.__entries[i][j]
+        if keys:
+            self.__maxes[i] = keys[-1]
+        else:
+            del self.__keys[i]
+            del self.__entries[i]
+            del self.__maxes[i]
+        self.__len -= 1
+        self.__version += 1
+
+
+def _index_entry(price, item):
+    if not _is_single_metal(price):
+        raise TypeError('MetalIndex accepts Metal prices only')
+    return price, item
+
+
+def _distance(key, target):
+    # equal infinities are no distance apart
+    distance = abs(key - target)
+    return 0 if distance != distance else distance
+
+
+class MetalAccumulator:
+
+    # running totals as plain int weapon counts, no Metal is created per
+    # value; infinities are counted apart from the finite sum so partial
+    # accumulators merge to the same answer in any order, +inf and -inf in
+    # one total only fail when that total is read
+    #
+    # total sums Metal values, range sums the bounds of every value with a
+    # Metal counted as a range of zero width
+
+    def __init__(self, values=()):
+        self.__count = 0
+        self.__min = None
+        self.__max = None
+        self.__total = [0, 0, 0]
+        self.__low = [0, 0, 0]
+        self.__high = [0, 0, 0]
+        self.update(values)
+
+    def add(self, value):
+        """
+        add a Metal, a RangeMetal or a literal string read by convert()
+        """
+        if value.__class__ is str:
+            value = convert(value)
+            if not isinstance(value, Metal):
+                raise ParserError('Bad Currency')
+        if _is_single_metal(value):
+            low = high = value.weapon
+            _add_weapon(self.__total, low)
+        elif isinstance(value, RangeMetal):
+            low = value.start.weapon
+            high = value.end.weapon
+        else:
+            raise TypeError('MetalAccumulator accepts Metal values only')
+        _add_weapon(self.__low, low)
+        _add_weapon(self.__high, high)
+        if self.__count == 0:
+            self.__min = low
+            self.__max = high
+        else:
+            if low < self.__min:
+                self.__min = low
+            if high > self.__max:
+                self.__max = high
+        self.__count += 1
+
+    def update(self, values):
+        # finite Metal values are summed in locals, anything else goes
+        # through add()
+        finite = 0
+        count = 0
+        low = high = None
+        weapon_of = _get_weapon
+        for value in values:
+            if value.__class__ is Metal:
+                weapon = weapon_of(value)
+                if weapon.__class__ is int:
+                    finite += weapon
+                    if count == 0:
+                        low = high = weapon
+                    elif weapon < low:
+                        low = weapon
+                    elif weapon > high:
+                        high = weapon
+                    count += 1
+                    continue
+            self.add(value)
+        if count:
+            for total in (self.__total, self.__low, self.__high):
+                total[0] += finite
+            if self.__count == 0 or low < self.__min:
+                self.__min = low
+            if self.__count == 0 or high > self.__max:
+                self.__max = high
+            self.__count += count
+        return self
+
+    def merge(self, other):
+        """
+        add the totals of another accumulator into this one
+        """
+        if not isinstance(other, MetalAccumulator):
+            raise TypeError('MetalAccumulator can only merge MetalAccumulator')
+        if other.__count:
+            for mine, theirs in ((self.__total, other.__total), (self.__low, other.__low), (self.__high, other.__high)):
+                for i in range(3):
+                    mine[i] += theirs[i]
+            if self.__count == 0 or other.__min < self.__min:
+                self.__min = other.__min
+            if self.__count == 0 or other.__max > self.__max:
+                self.__max = other.__max
+            self.__count += other.__count
+        return self
+
+    @property
+    def count(self):
+        return self.__count
+
+    @property
+    def total(self):
+        return Metal._from_weapon(_weapon_total(self.__total))
+
+    @property
+    def range(self):
+        return RangeMetal(
+            Metal._from_weapon(_weapon_total(self.__low)),
+            Metal._from_weapon(_weapon_total(self.__high))
+        )
+
+    @property
+    def min(self):
+        if self.__min is None:
+            return None
+        return Metal._from_weapon(self.__min)
+
+    @property
+    def max(self):
+        if self.__max is None:
+            return None
+        return Metal._from_weapon(self.__max)
+
+    def __repr__(self):
+        classname = self.__class__.__name__
+        return f'{classname}(count={self.__count}, total={self.total!r}, range={self.range!r})'
+
+
+def _add_weapon(total, weapon):
+    # total is [finite sum, +inf count, -inf count]
+    if weapon.__class__ is float:
+        total[1 if weapon > 0 else 2] += 1
+    else:
+        total[0] += weapon
+
+
+def _weapon_total(total):
+    finite, positive, negative = total
+    if positive and negative:
+        raise ValueError('Metal can not be NaN')
+    if positive:
+        return float('inf')
+    if negative:
+        return float('-inf')
+    return finite
+
+
+def _unpickle_metal(weapon, scrap=None):
+    if scrap is None:
+        return Metal._from_weapon(weapon)
+    self = object.__new__(Metal)
+    _set_weapon(self, weapon)
+    _set_scrap(self, D(scrap))
+    return self
+
+
+def _unpickle_range(start, end):
+    return RangeMetal(Metal._from_weapon(start), Metal._from_weapon(end))
+
+
+# bulk wire format: packed little-endian int64 weapon counts, the largest
+# and smallest int64 stand for +inf and -inf
+_WIRE_INF = 2 ** 63 - 1
+_WIRE_NEG_INF = -2 ** 63
+
+
+def _wire_weapon(metal):
+    if not _is_single_metal(metal):
+        raise TypeError('to_bytes accepts Metal values only')
+    weapon = metal.weapon
+    if weapon.__class__ is float:
+        return _WIRE_INF if weapon > 0 else _WIRE_NEG_INF
+    if not _WIRE_NEG_INF < weapon < _WIRE_INF:
+        raise OverflowError('Metal is too large for the wire format')
+    return weapon
+
+
+def to_bytes(metals):
+    """
+    pack Metal values as little-endian int64 weapon counts
+    """
+    weapons = array('q', [_wire_weapon(m) for m in metals])
+    if sys.byteorder == 'big':
+        weapons.byteswap()
+    return weapons.tobytes()
+
+
+def weapons_view(data):
+    """
+    the int64 weapon counts of to_bytes() output as a memoryview, without
+    copying on little-endian hosts
+    """
+    view = memoryview(data).cast('B')
+    if len(view) % 8:
+        raise ValueError('Wire data must be a whole number of int64')
+    if sys.byteorder == 'big':
+        weapons = array('q', view)
+        weapons.byteswap()
+        return memoryview(weapons)
+    return view.cast('q')
+
+
+def from_bytes(data):
+    """
+    unpack to_bytes() output into a list of Metal
+    """
+    metal = Metal._from_weapon
+    inf = float('inf')
+    return [
+        metal(w) if _WIRE_NEG_INF < w < _WIRE_INF else metal(inf if w > 0 else -inf)
+        for w in weapons_view(data)
+    ]
+
+
+def ranges_to_bytes(ranges):
+    """
+    pack RangeMetal values as (start, end) pairs in the to_bytes() format,
+    a Metal is stored as a range with start == end
+    """
+    metals = []
+    for r in ranges:
+        if isinstance(r, RangeMetal):
+            metals.extend(r)
+        elif _is_single_metal(r):
+            metals.append(r)
+            metals.append(r)
+        else:
+            raise TypeError('ranges_to_bytes accepts RangeMetal or Metal values only')
+    return to_bytes(metals)
+
+
+def ranges_from_bytes(data):
+    """
+    unpack ranges_to_bytes() output, pairs with start == end come back as
+    Metal
+    """
+    metals = from_bytes(data)
+    if len(metals) % 2:
+        raise ValueError('Wire data must be a whole number of ranges')
+    return [RangeMetal(metals[i], metals[i + 1]) for i in range(0, len(metals), 2)]
+
+
 class ParserError(Exception):
 
-    def __init__(self, message):
+    def __init__(self, message, pos=None):
         super(ParserError, self).__init__()
         self.message = message
+        self.pos = pos
 
     def __repr__(self):
         classname = self.__class__.__name__
@@ -427,141 +1370,1548 @@ def _is_single_metal(obj):
 
 def _is_number(obj):
     try:
-        D(obj)
+        D(obj, _context)
         return True
     except Exception:
         return False
 
 
 def normalize(d):
-    return d.quantize(D('1')) if d.is_finite() and d == d.to_integral() else d.normalize()
+    if d.is_finite() and d == d.to_integral(context=_context):
+        return d.quantize(D('1'), context=_context)
+    return d.normalize(_context)
 
 
-def convert(expr):
-    words = [
-        'ref',
-        'refined',
-        'rec',
-        'reclaimed',
-        'scrap',
-        'wep',
-        'weapon'
-    ]
-    expr = ''.join(expr.lower().split())
-    keywords = re.sub(r'[\d.]', ' ', expr).split()
-    for w in keywords:
-        if w not in words:
-            raise ParserError('Bad Currency')
-    if not keywords:
-        return D(expr)
-    ref = D('0')
-    rec = D('0')
-    scrap = D('0')
-    wep = D('0')
-    for w in keywords:
-        index = expr.find(w)
-        value = expr[:index]
-        if not value:
-            raise ParserError('Bad Number')
-        expr = expr[index + len(w):]
-        if w == 'ref' or w == 'refined':
-            ref += D(value)
-        elif w == 'rec' or w == 'reclaimed':
-            rec += D(value)
-        elif w == 'scrap':
-            scrap += D(value)
-        elif w == 'wep' or w == 'weapon':
-            wep += D(value)
-    if expr:
-        raise ParserError('Bad Currency')
-    return Metal(ref, rec, scrap, wep)
+def _ref_w(scrap):
+    return (scrap * D('2')).quantize(D('1'))
 
 
-def lex(expr):
-    tokens = []
-    while expr:
-        char = expr[0]
-        expr = expr[1:]
-        if char == "(":
-            try:
-                paren, expr = lex(expr)
-                tokens.append(paren)
-            except ValueError:
-                raise ParserError('Paren Mismatch')
-        elif char == ")":
-            for i, v in enumerate(tokens):
-                if not isinstance(v, list) and v not in symbols:
-                    tokens[i] = convert(v)
-            return tokens, expr
-        elif char in symbols:
-            tokens.append(char)
-        elif char.isspace():
-            pass
-        else:
-            try:
-                if tokens[-1] in symbols:
-                    tokens.append(char)
-                elif isinstance(tokens[-1], list):
-                    raise ParserError('Invalid Syntax')
+def _ref_W(scrap):
+    return (scrap % D('1') * D('2')).quantize(D('1'))
+
+
+def _ref_s(scrap):
+    return scrap.quantize(D('.1'))
+
+
+def _ref_S(scrap):
+    return (scrap % D('3')).quantize(D('1'), rounding=ROUND_DOWN)
+
+
+def _ref_c(scrap):
+    return (scrap // D('3') + _ref_S(scrap) * D('0.33') + _ref_W(scrap) * D('0.16')).quantize(D('.01'))
+
+
+def _ref_C(scrap):
+    return (scrap % D('9') // D('3')).quantize(D('.01'))
+
+
+def _ref_r(scrap):
+    return (scrap // D('9') + _ref_C(scrap) * D('0.33') + _ref_S(scrap) * D('0.11') + _ref_W(scrap) * D('0.05')).quantize(D('.01'))
+
+
+def _ref_R(scrap):
+    return (scrap // D('9')).quantize(D('.01'))
+
+
+def _strfref_field(func):
+    return lambda scrap: str(normalize(func(scrap)))
+
+
+_strfref_fields = {
+    'w': _strfref_field(_ref_w),
+    'W': _strfref_field(_ref_W),
+    's': _strfref_field(_ref_s),
+    'S': _strfref_field(_ref_S),
+    'c': _strfref_field(_ref_c),
+    'C': _strfref_field(_ref_C),
+    'r': _strfref_field(_ref_r),
+    'R': _strfref_field(_ref_R)
+}
+
+
+def _residue_table(key, whole, modulus):
+    # suffix strings for each residue of the absolute weapon count, taken
+    # from the Decimal formatter so both always agree
+    suffixes = []
+    for residue in range(modulus):
+        text = _strfref_fields[key](D(residue) / D('2'))
+        prefix = str(whole(residue))
+        assert text.startswith(prefix)
+        suffixes.append(text[len(prefix):])
+    return whole, modulus, tuple(suffixes)
+
+
+# a finite value renders as sign + whole(abs(weapon)) + suffix for
+# abs(weapon) % modulus, negative values keep the sign even on zero parts
+with decimal.localcontext(_context):
+    _strfref_residues = {
+        'w': _residue_table('w', lambda a: a, 1),
+        'W': _residue_table('W', lambda a: a % 2, 1),
+        's': _residue_table('s', lambda a: a // 2, 2),
+        'S': _residue_table('S', lambda a: a // 2 % 3, 1),
+        'c': _residue_table('c', lambda a: a // 6, 6),
+        'C': _residue_table('C', lambda a: a // 2 % 9 // 3, 1),
+        'r': _residue_table('r', lambda a: a // 18, 18),
+        'R': _residue_table('R', lambda a: a // 18, 1)
+    }
+
+
+_strfref_keys = {func: key for key, func in _strfref_fields.items()}
+
+# the Decimal formatter runs out of precision from here on, larger values
+# keep its output
+_residue_limit = 10 ** 16
+
+
+@lru_cache(maxsize=256)
+def _compile_residues(fmt):
+    # _compile_strfref with each field replaced by its residue table
+    return tuple(
+        part if part.__class__ is str else _strfref_residues[_strfref_keys[part]]
+        for part in _compile_strfref(fmt)
+    )
+
+
+@lru_cache(maxsize=256)
+def _compile_strfref(fmt):
+    # split a strfref format into a tuple of literal strings and field
+    # functions, adjacent literals are merged
+    template = []
+    literal = []
+    push = literal.append
+    i = 0
+    n = len(fmt)
+    while i < n:
+        char = fmt[i]
+        i += 1
+        if char == '%':
+            if i < n:
+                char = fmt[i]
+                i += 1
+                if char in _strfref_fields:
+                    if literal:
+                        template.append(''.join(literal))
+                        literal.clear()
+                    template.append(_strfref_fields[char])
+                elif char == '%':
+                    push('%')
                 else:
-                    tokens[-1] += char
-            except IndexError:
-                tokens.append(char)
-    for i, v in enumerate(tokens):
-        if not isinstance(v, list) and v not in symbols:
-            tokens[i] = convert(v)
-    return tokens
+                    push('%')
+                    push(char)
+            else:
+                push('%')
+        else:
+            push(char)
+    if literal:
+        template.append(''.join(literal))
+    return tuple(template)
 
 
-def evaluate(tokens):
-    for symbol, func in operations.items():
+def _import_numpy():
+    global np
+    if np is None:
         try:
-            pos = tokens.index(symbol)
-            leftTerm = evaluate(tokens[:pos])
-            if leftTerm is None:
-                if symbol in '+-' and pos + 1 < len(tokens) and tokens[pos + 1] not in ['+', '-', '*', '/']:
-                    leftTerm = D('0')
+            import numpy as np
+        except ImportError:
+            raise ImportError('MetalArray requires numpy')
+    return np
+
+
+def _weapon_array(weapons):
+    weapons = np.array(weapons)
+    if weapons.size == 0:
+        weapons = weapons.astype(np.int64)
+    if weapons.dtype.kind == 'O' and all(w.__class__ is int for w in weapons.flat):
+        weapons = weapons.astype(np.int64)
+    if weapons.dtype.kind not in 'iu':
+        raise ValueError('MetalArray can only hold finite Metal')
+    weapons = weapons.astype(np.int64, copy=False).reshape(-1)
+    weapons.flags.writeable = False
+    return weapons
+
+
+def _wire_array(data):
+    # to_bytes() output as a read-only int64 array, a view where possible
+    view = memoryview(data).cast('B')
+    if len(view) % 8:
+        raise ValueError('Wire data must be a whole number of int64')
+    weapons = np.frombuffer(view, dtype='<i8')
+    if ((weapons == _WIRE_INF) | (weapons == _WIRE_NEG_INF)).any():
+        raise ValueError('MetalArray can only hold finite Metal')
+    weapons = weapons.astype(np.int64, copy=False)
+    weapons.flags.writeable = False
+    return weapons
+
+
+def _wire_bytes(weapons):
+    if ((weapons == _WIRE_INF) | (weapons == _WIRE_NEG_INF)).any():
+        raise OverflowError('Metal is too large for the wire format')
+    return weapons.astype('<i8', copy=False).tobytes()
+
+
+def _vector_column(column):
+    # a MetalArray for finite Metal columns, an int64 array for int
+    # columns, None for anything else
+    if isinstance(column, MetalArray):
+        return column
+    if isinstance(column, np.ndarray):
+        return column.astype(np.int64) if column.dtype.kind in 'iu' and column.ndim == 1 else None
+    column = list(column)
+    if all(value.__class__ is Metal and value.weapon.__class__ is int for value in column):
+        return MetalArray.from_weapons([value.weapon for value in column])
+    if all(value.__class__ is int for value in column):
+        try:
+            return np.array(column, dtype=np.int64)
+        except OverflowError:
+            return None
+    return None
+
+
+def _int_factors(other):
+    # a 1-d integer ndarray of per-value factors, or None
+    if isinstance(other, np.ndarray) and other.dtype.kind in 'iu' and other.ndim == 1:
+        return other.astype(object if other.dtype.kind == 'u' else np.int64)
+    return None
+
+
+def _other_weapons(other):
+    if _is_single_metal(other):
+        weapon = other.weapon
+        if isinstance(weapon, float):
+            raise ValueError('MetalArray can only hold finite Metal')
+        return weapon
+    if isinstance(other, MetalArray):
+        return other.weapons
+    return None
+
+
+def _number_ratio(number):
+    try:
+        return D(number, _context).as_integer_ratio()
+    except (ValueError, OverflowError):
+        raise ValueError('MetalArray can only hold finite Metal')
+
+
+def _scale_weapons(weapons, num, den):
+    # weapons * num / den rounded half even, the same rounding Metal uses,
+    # num is an int or an array of per-value ints
+    if den < 0:
+        num, den = -num, -den
+    largest = abs(num) if isinstance(num, int) else int(np.abs(num).max(initial=0))
+    if weapons.size and int(np.abs(weapons).max()) * largest >= 2 ** 63:
+        # exact ratios of floats get large, fall back to python ints
+        weapons = weapons.astype(object)
+    weapons = weapons * num
+    if den != 1:
+        weapons = _div_half_even_array(weapons, den)
+    return weapons
+
+
+def _div_half_even_array(n, d):
+    # elementwise n / d rounded half even, d is an array or a positive int
+    if isinstance(d, np.ndarray):
+        n = np.where(d < 0, -n, n)
+        d = np.abs(d)
+    q = n // d
+    r = (n - q * d) * 2
+    return q + ((r > d) | ((r == d) & (q % 2 == 1)))
+
+
+def _range_columns(other):
+    if isinstance(other, RangeMetalArray):
+        return other.start.weapons, other.end.weapons
+    if isinstance(other, RangeMetal):
+        return _other_weapons(other.start), _other_weapons(other.end)
+    weapons = _other_weapons(other)
+    if weapons is None:
+        return None
+    return weapons, weapons
+
+
+def _ratio_array(n, d):
+    # n / d as Decimals rounded to 0.01, like Metal / Metal
+    if np.any(d == 0):
+        raise ZeroDivisionError('RangeMetalArray division by zero')
+    hundredths = _div_half_even_array(n * 100, d)
+    values, inverse = np.unique(hundredths, return_inverse=True)
+    ratios = [normalize(D(h).scaleb(-2, _context)) for h in values.tolist()]
+    return np.array(ratios, dtype=object)[inverse.reshape(-1)]
+
+
+_pandas_types = {}
+_pandas_lock = threading.Lock()
+
+
+def _import_pandas():
+    # the pandas and Arrow types subclass optional base classes, they are
+    # built and registered once, on first use
+    with _pandas_lock:
+        if not _pandas_types:
+            try:
+                import pandas
+            except ImportError:
+                raise ImportError('MetalDtype requires pandas')
+            _import_numpy()
+            _pandas_types.update(_build_pandas_types(pandas))
+            globals().update(_pandas_types)
+    return _pandas_types
+
+
+def __getattr__(name):
+    # MetalDtype, MetalExtensionArray and MetalArrowType are built on first
+    # access, so importing metal never imports pandas
+    if name in ('MetalDtype', 'MetalExtensionArray', 'MetalArrowType'):
+        types = _import_pandas()
+        if name not in types:
+            raise ImportError(f'{name} requires pyarrow')
+        return types[name]
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def _column_weapon(value):
+    # weapon count of a Metal or a literal like '2.33ref' (bare numbers
+    # are refined) for a metal column
+    metal = _as_metal(value)
+    if not _is_single_metal(metal) or isinstance(metal.weapon, float):
+        raise ValueError('Metal columns can only hold finite Metal')
+    return metal.weapon
+
+
+def _build_pandas_types(pd):
+    from pandas.api.extensions import ExtensionArray
+    from pandas.api.extensions import ExtensionDtype
+    from pandas.api.extensions import register_extension_dtype
+    from pandas.api.extensions import take
+    from pandas.api.indexers import check_array_indexer
+    try:
+        import pyarrow as pa
+    except ImportError:
+        pa = None
+
+    @register_extension_dtype
+    class MetalDtype(ExtensionDtype):
+
+        # pandas dtype 'metal', finite metal values stored as int64 weapons
+        # with a mask of missing values
+
+        __qualname__ = 'MetalDtype'
+        name = 'metal'
+        type = Metal
+        kind = 'O'
+        na_value = pd.NA
+
+        @classmethod
+        def construct_array_type(cls):
+            return MetalExtensionArray
+
+        def __repr__(self):
+            return f'{self.__class__.__name__}()'
+
+        def __from_arrow__(self, array):
+            chunks = array.chunks if isinstance(array, pa.ChunkedArray) else [array]
+            arrays = []
+            for chunk in chunks:
+                if isinstance(chunk, pa.ExtensionArray):
+                    chunk = chunk.storage
+                chunk = chunk.cast(pa.int64())
+                weapons = chunk.fill_null(0).to_numpy(zero_copy_only=False)
+                mask = chunk.is_null().to_numpy(zero_copy_only=False)
+                arrays.append(MetalExtensionArray(weapons, mask))
+            if not arrays:
+                return MetalExtensionArray([])
+            return MetalExtensionArray._concat_same_type(arrays)
+
+    class MetalExtensionArray(ExtensionArray):
+
+        # pandas extension array behind the 'metal' dtype, an int64 array of
+        # weapons and a bool array marking missing values; sums, sorting and
+        # comparisons run on the ints, Metal objects are only made when a
+        # single value is read
+
+        __qualname__ = 'MetalExtensionArray'
+        __array_priority__ = 1000
+
+        def __init__(self, weapons, mask=None):
+            weapons = np.asarray(weapons, dtype=np.int64).reshape(-1)
+            if mask is None:
+                mask = np.zeros(len(weapons), dtype=bool)
+            self.__weapons = weapons
+            self.__mask = np.asarray(mask, dtype=bool).reshape(-1)
+
+        @classmethod
+        def _from_sequence(cls, scalars, *, dtype=None, copy=False):
+            """
+            Metal values or literals like '2.33ref' (bare numbers are
+            refined), each distinct value is parsed once
+            """
+            if isinstance(scalars, cls):
+                return scalars.copy() if copy else scalars
+            if isinstance(scalars, MetalArray):
+                return cls(scalars.weapons.copy())
+            codes, uniques = pd.factorize(np.asarray(scalars, dtype=object))
+            table = np.array([_column_weapon(value) for value in uniques], dtype=np.int64)
+            mask = codes < 0
+            weapons = table[codes] if len(table) else np.zeros(len(codes), dtype=np.int64)
+            weapons[mask] = 0
+            return cls(weapons, mask)
+
+        @classmethod
+        def _from_sequence_of_strings(cls, strings, *, dtype=None, copy=False):
+            return cls._from_sequence(strings, dtype=dtype, copy=copy)
+
+        @property
+        def weapons(self):
+            return self.__weapons
+
+        @property
+        def dtype(self):
+            return MetalDtype()
+
+        @property
+        def nbytes(self):
+            return self.__weapons.nbytes + self.__mask.nbytes
+
+        def __len__(self):
+            return len(self.__weapons)
+
+        def __getitem__(self, item):
+            if isinstance(item, (int, np.integer)):
+                if self.__mask[item]:
+                    return pd.NA
+                return Metal._from_weapon(int(self.__weapons[item]))
+            item = check_array_indexer(self, item)
+            return MetalExtensionArray(self.__weapons[item], self.__mask[item])
+
+        def __setitem__(self, key, value):
+            key = check_array_indexer(self, key)
+            if pd.api.types.is_list_like(value):
+                value = MetalExtensionArray._from_sequence(value)
+                self.__weapons[key] = value.__weapons
+                self.__mask[key] = value.__mask
+            elif pd.isna(value):
+                self.__weapons[key] = 0
+                self.__mask[key] = True
+            else:
+                self.__weapons[key] = _column_weapon(value)
+                self.__mask[key] = False
+
+        def __array__(self, dtype=None, copy=None):
+            values = np.array([Metal._from_weapon(w) for w in self.__weapons.tolist()], dtype=object)
+            values[self.__mask] = pd.NA
+            return values if dtype is None else values.astype(dtype)
+
+        def __arrow_array__(self, type=None):
+            storage = pa.array(self.__weapons, mask=self.__mask, type=pa.int64())
+            return pa.ExtensionArray.from_storage(MetalArrowType(), storage)
+
+        def isna(self):
+            return self.__mask.copy()
+
+        def copy(self):
+            return MetalExtensionArray(self.__weapons.copy(), self.__mask.copy())
+
+        def take(self, indices, *, allow_fill=False, fill_value=None):
+            weapon = 0
+            missing = True
+            if allow_fill and fill_value is not None and not pd.isna(fill_value):
+                weapon = _column_weapon(fill_value)
+                missing = False
+            weapons = take(self.__weapons, indices, allow_fill=allow_fill, fill_value=weapon)
+            mask = take(self.__mask, indices, allow_fill=allow_fill, fill_value=missing)
+            return MetalExtensionArray(weapons, mask)
+
+        @classmethod
+        def _concat_same_type(cls, to_concat):
+            weapons = np.concatenate([array.__weapons for array in to_concat])
+            mask = np.concatenate([array.__mask for array in to_concat])
+            return cls(weapons, mask)
+
+        def _formatter(self, boxed=False):
+            return str
+
+        def _values_for_argsort(self):
+            return self.__weapons
+
+        def __ints(self):
+            return pd.arrays.IntegerArray(self.__weapons, self.__mask)
+
+        @classmethod
+        def __from_ints(cls, ints):
+            return cls(ints.to_numpy(dtype=np.int64, na_value=0), ints.isna())
+
+        def factorize(self, use_na_sentinel=True):
+            codes, uniques = self.__ints().factorize(use_na_sentinel=use_na_sentinel)
+            return codes, MetalExtensionArray.__from_ints(uniques)
+
+        def unique(self):
+            return MetalExtensionArray.__from_ints(self.__ints().unique())
+
+        def strfref(self, fmt):
+            """
+            strfref(fmt) of every value as a pandas string array, each
+            distinct value is rendered once
+            """
+            uniques, inverse = np.unique(self.__weapons, return_inverse=True)
+            rendered = np.array(MetalArray.from_weapons(uniques).strfref(fmt), dtype=object)
+            values = rendered[inverse.reshape(-1)] if len(uniques) else np.array([], dtype=object)
+            values[self.__mask] = None
+            return pd.array(values, dtype='string')
+
+        def _reduce(self, name, *, skipna=True, keepdims=False, **kwargs):
+            if name == 'mean':
+                count = int((~self.__mask).sum())
+                if not count or not skipna and self.__mask.any():
+                    result = pd.NA
                 else:
-                    raise ParserError('Bad Expression')
-            rightTerm = evaluate(tokens[pos + 1:])
-            if rightTerm is None:
-                raise ParserError('Bad Expression')
-            return func(leftTerm, rightTerm)
-        except ValueError:
-            pass
-    if len(tokens) is 1:
-        if isinstance(tokens[0], list):
-            return evaluate(tokens[0])
-        return tokens[0]
-    elif not tokens:
+                    total = int(self.__weapons[~self.__mask].sum())
+                    result = Metal._from_weapon(_div_half_even(total, count))
+            elif name in ('sum', 'min', 'max'):
+                result = self.__ints()._reduce(name, skipna=skipna, **kwargs)
+                if not pd.isna(result):
+                    result = Metal._from_weapon(int(result))
+            else:
+                raise TypeError(f"metal does not support reduction '{name}'")
+            if keepdims:
+                return MetalExtensionArray._from_sequence([result])
+            return result
+
+        def _groupby_op(self, *, how, has_dropped_na, min_count, ngroups, ids, **kwargs):
+            if how == 'mean':
+                counts = np.bincount(ids[(ids >= 0) & ~self.__mask], minlength=ngroups)
+                totals = self.__ints()._groupby_op(
+                    how='sum', has_dropped_na=has_dropped_na, min_count=0, ngroups=ngroups, ids=ids, **kwargs
+                ).to_numpy(dtype=np.int64, na_value=0)
+                weapons = _div_half_even_array(totals, np.maximum(counts, 1))
+                return MetalExtensionArray(weapons, counts == 0)
+            if how not in ('sum', 'min', 'max', 'first', 'last', 'cumsum', 'cummin', 'cummax', 'rank'):
+                raise TypeError(f"metal does not support operation '{how}'")
+            result = self.__ints()._groupby_op(
+                how=how, has_dropped_na=has_dropped_na, min_count=min_count, ngroups=ngroups, ids=ids, **kwargs
+            )
+            if how == 'rank':
+                return result
+            return MetalExtensionArray.__from_ints(result)
+
+        def __other(self, other):
+            # weapons and mask of the other operand, None when not comparable
+            if isinstance(other, (pd.Series, pd.Index, pd.DataFrame)):
+                return None
+            if isinstance(other, MetalExtensionArray):
+                return other.__weapons, other.__mask
+            if pd.api.types.is_list_like(other):
+                other = MetalExtensionArray._from_sequence(other)
+                return other.__weapons, other.__mask
+            if pd.isna(other):
+                return 0, True
+            if not _is_single_metal(other) and not isinstance(other, str):
+                return None
+            return _column_weapon(other), False
+
+        def __compare(self, other, compare):
+            other = self.__other(other)
+            if other is None:
+                return NotImplemented
+            weapons, mask = other
+            result = compare(self.__weapons, weapons)
+            mask = self.__mask | mask
+            return pd.arrays.BooleanArray(np.broadcast_to(result, mask.shape).copy(), mask.copy())
+
+        def __eq__(self, other):
+            return self.__compare(other, lambda a, b: a == b)
+
+        def __ne__(self, other):
+            return self.__compare(other, lambda a, b: a != b)
+
+        def __ge__(self, other):
+            return self.__compare(other, lambda a, b: a >= b)
+
+        def __le__(self, other):
+            return self.__compare(other, lambda a, b: a <= b)
+
+        def __gt__(self, other):
+            return self.__compare(other, lambda a, b: a > b)
+
+        def __lt__(self, other):
+            return self.__compare(other, lambda a, b: a < b)
+
+    types = {'MetalDtype': MetalDtype, 'MetalExtensionArray': MetalExtensionArray}
+    if pa is None:
+        return types
+
+    class MetalArrowType(pa.ExtensionType):
+
+        # Arrow extension type of metal columns, int64 weapons storage,
+        # converts to the 'metal' pandas dtype
+
+        __qualname__ = 'MetalArrowType'
+
+        def __init__(self):
+            super().__init__(pa.int64(), 'metal.metal')
+
+        def __arrow_ext_serialize__(self):
+            return b''
+
+        @classmethod
+        def __arrow_ext_deserialize__(cls, storage_type, serialized):
+            return cls()
+
+        def to_pandas_dtype(self):
+            return MetalDtype()
+
+    try:
+        pa.register_extension_type(MetalArrowType())
+    except pa.ArrowKeyError:
+        pass
+    types['MetalArrowType'] = MetalArrowType
+    return types
+
+
+def register_pandas():
+    """
+    register the 'metal' pandas dtype and the 'metal.metal' Arrow type, so
+    that dtype='metal' and pd.read_parquet() of metal columns work; this is
+    done at import when pandas is imported before metal
+    """
+    _import_pandas()
+
+
+if 'pandas' in sys.modules:
+    register_pandas()
+
+
+def _parse_weapon(ref, rec, scrap, weapon):
+    # (weapon count, scrap form) where the scrap form is the Decimal the
+    # general path sums to when that is not the canonical one, else None;
+    # plain non-negative literals with at most two decimals, the usual
+    # listing prices, are summed from per-unit tables
+    total = 0
+    odd = 0
+    for value, per_unit, table in zip((ref, rec, scrap, weapon), _unit_weapons, _fraction_weapons):
+        if value == '0':
+            continue
+        split = _split_hundredths(value)
+        if split is None:
+            return _parse_weapon_decimal(ref, rec, scrap, weapon)
+        whole, hundredths = split
+        fraction = table[hundredths]
+        if fraction is None:
+            fraction = table[hundredths] = _fraction_weapon(per_unit, hundredths)
+        part = whole * per_unit + fraction
+        odd |= part
+        total += part
+    if odd & 1 and not total & 1:
+        # an odd part adds a half scrap term, which leaves a trailing .0
+        # on a whole scrap total
+        return total, D(f'{total // 2}.0')
+    return total, None
+
+
+# weapons per unit of ref, rec, scrap and weapon
+_unit_weapons = (18, 6, 2, 1)
+
+# weapons for each hundredth of a unit, filled from the general path on
+# first use; a unit's count is linear in its whole part, so
+# whole * per_unit + table[hundredths] is exact
+_fraction_weapons = tuple([None] * 100 for _ in _unit_weapons)
+
+
+def _fraction_weapon(per_unit, hundredths):
+    args = ['0', '0', '0', '0']
+    args[_unit_weapons.index(per_unit)] = '0.{:02d}'.format(hundredths)
+    return _parse_weapon_decimal(*args)[0]
+
+
+def _split_hundredths(value):
+    # (whole, hundredths) for a non-negative int, str or Decimal with at
+    # most two decimals and twelve whole digits, None for anything else
+    cls = value.__class__
+    if cls is int:
+        return (value, 0) if 0 <= value < 10 ** 12 else None
+    if cls is D:
+        value = str(value)
+    elif cls is not str:
         return None
+    whole, _, fraction = value.partition('.')
+    digits = whole + fraction
+    if len(fraction) > 2 or len(whole) > 12 or not digits.isdigit() or not digits.isascii():
+        return None
+    return int(whole or '0'), int(fraction.ljust(2, '0'))
+
+
+@_decimal_context
+def _parse_weapon_decimal(ref, rec, scrap, weapon):
+    # init with 0 metal
+    total = D('0')
+    # init infinity
+    all_currency = (D(ref), D(rec), D(scrap), D(weapon))
+    if D('inf') in all_currency:
+        total += D('inf')
+    if D('-inf') in all_currency:
+        total += D('-inf')
+    if total == D('NaN') or D('NaN') in all_currency:
+        raise ValueError('Metal can not be NaN')
+    if total != D('0'):
+        return _weapon_count(total), None
+    # load weapon arg
+    weapon = D(weapon).quantize(D('1'), rounding=ROUND_DOWN)
+    # put 0.5 scrap per weapon into metal storage
+    total += weapon / D('2')
+    # load scrap arg, rounding to 0.5 scrap
+    scrap = (D(scrap) * D('2')).quantize(D('1')) / D('2')
+    # put scrap into storage
+    total += scrap
+    # rec3 stands for reclaimed rounding to 0.33
+    rec3 = ((D(rec) * D('3')).quantize(D('1')) / D('3')).quantize(D('.01'), rounding=ROUND_DOWN)
+    # rec9 stands for reclaimed rounding to 0.11
+    rec9 = ((D(rec) * D('9')).quantize(D('1')) / D('9')).quantize(D('.01'), rounding=ROUND_DOWN)
+    # put integer part of rec3 into storage, 3 scrap per reclaimed
+    total += D('3') * (rec3 // D('1'))
+    # put decimal part of rec3 into storage, 1 scrap per 0.33 reclaimed
+    total += rec3 % D('1') // D('0.33')
+    # adjust storage with 0.5 scrap, that's the part of reclaimed over 0.33
+    if rec9 > rec3:
+        total += D('0.5')
+    if rec9 < rec3:
+        total -= D('0.5')
+    # ref9 stands for refined rounding to 0.11
+    ref9 = ((D(ref) * D('9')).quantize(D('1')) / D('9')).quantize(D('.01'), rounding=ROUND_DOWN)
+    # ref18 stands for refined rounding to 0.05
+    ref18 = ((D(ref) * D('18')).quantize(D('1')) / D('18')).quantize(D('.01'), rounding=ROUND_DOWN)
+    # put integer part of ref9 into storage, 9 scrap per refined
+    total += D('9') * (ref9 // D('1'))
+    # put decimal part of ref9 into storage, 1 scrap per 0.11 reclaimed
+    total += ref9 % D('1') // D('0.11')
+    # adjust storage with 0.5 scrap, that's the part of refined over 0.11
+    if ref18 > ref9:
+        total += D('0.5')
+    if ref18 < ref9:
+        total -= D('0.5')
+    # total is a whole number of half scrap at this point
+    weapon = _weapon_count(total * D('2'))
+    if str(total) == str(_weapon_scrap(weapon)):
+        return weapon, None
+    return weapon, total
+
+
+def _weapon_count(d):
+    if d.is_nan():
+        raise ValueError('Metal can not be NaN')
+    if d.is_infinite():
+        return float(d)
+    return int(d.quantize(D('1'), context=_context))
+
+
+def _div_half_even(n, d):
+    if d < 0:
+        n, d = -n, -d
+    q, r = divmod(n, d)
+    r += r
+    if r > d or r == d and q & 1:
+        q += 1
+    return q
+
+
+def tokenize(expr):
+    # single pass scanner, yields Token(kind, value, pos) where pos is the
+    # index of the token in expr; whitespace inside a number or a unit is
+    # ignored, so '1 . 5 ref' reads the same as '1.5ref'
+    for match in _token_re.finditer(expr):
+        kind = match.lastgroup
+        if kind == 'space':
+            continue
+        value = match.group()
+        if kind == NUMBER:
+            value = ''.join(value.split())
+        elif kind == UNIT:
+            value = ''.join(value.lower().split())
+        yield Token(kind, value, match.start())
+
+
+def _convert_literal(tokens):
+    # tokens is a run of number and unit tokens without operators between,
+    # literals are parsed once per distinct run of token values
+    try:
+        return _parse_literal(tuple([token.value for token in tokens]))
+    except ParserError as e:
+        if e.pos is not None:
+            e.pos = tokens[e.pos].pos
+        raise
+
+
+@lru_cache(maxsize=4096)
+def _parse_literal(values):
+    # error positions are indexes into values
+    for i, value in enumerate(values):
+        if not _is_number_token(value) and value not in units:
+            raise ParserError('Bad Currency', i)
+    for i, value in enumerate(values):
+        if _is_number_token(value) and not _number_re.fullmatch(value):
+            raise ParserError('Bad Number', i)
+    if len(values) == 1 and _is_number_token(values[0]):
+        return D(values[0])
+    # a unit given once keeps its literal string for the table fast path
+    amounts = {}
+    number = None
+    for i, value in enumerate(values):
+        if _is_number_token(value):
+            number = i
+        elif number is None:
+            raise ParserError('Bad Number', i)
+        else:
+            unit = units[value]
+            if unit in amounts:
+                amounts[unit] = _context.add(D(amounts[unit]), D(values[number]))
+            else:
+                amounts[unit] = values[number]
+            number = None
+    if number is not None:
+        raise ParserError('Bad Currency', number)
+    keys = D(amounts.pop('key', '0'))
+    if keys:
+        # keys are priced at evaluation time, with the current exchange rate
+        return KeyPrice(keys, Metal(**amounts))
+    return Metal(**amounts)
+
+
+def _is_number_token(value):
+    # number tokens start with a digit or a dot, units never do
+    return value[0] == '.' or value[0].isdecimal()
+
+
+@lru_cache(maxsize=4096)
+def _key_weapons(keys, rate):
+    num, den = keys.as_integer_ratio()
+    return _div_half_even(num * rate, den)
+
+
+def _key_price(price):
+    rate = EXCHANGE_RATE
+    if rate is None:
+        raise ParserError('No Exchange Rate')
+    return Metal._from_weapon(price.metal.weapon + _key_weapons(price.keys, rate.weapon))
+
+
+def _as_metal(value):
+    # a Metal, or a literal like '52.33ref' or '-1ref' where bare numbers
+    # are refined
+    if not _is_single_metal(value):
+        text = str(value).strip()
+        sign = text[:1]
+        if sign == '-' or sign == '+':
+            text = text[1:]
+        value = convert(text)
+        if isinstance(value, D):
+            value = Metal(ref=value)
+        if sign == '-':
+            value = -value
+    return value
+
+
+def _weapon_steps(start, end, step, fmt):
+    # arguments are checked here, the walk itself is lazy
+    step = Metal._from_weapon(1) if step is None else _as_metal(step)
+    if not _is_single_metal(step) or isinstance(step.weapon, float) or step.weapon <= 0:
+        raise ValueError('Step must be a positive finite Metal')
+    start = start.weapon
+    end = end.weapon
+    if isinstance(start, float) or isinstance(end, float):
+        raise ValueError('Steps need finite bounds')
+    weapons = range(start, end + 1, step.weapon)
+    if fmt is None:
+        return map(Metal._from_weapon, weapons)
+    return _render_weapons(weapons, fmt)
+
+
+def _render_weapons(weapons, fmt):
+    # Metal.strfref(fmt) for each weapon count without making the Metal
+    parts = _compile_residues(fmt)
+    for weapon in weapons:
+        if 0 <= weapon < _residue_limit:
+            yield ''.join([
+                part if part.__class__ is str else str(part[0](weapon)) + part[2][weapon % part[1]]
+                for part in parts
+            ])
+        else:
+            yield Metal._from_weapon(weapon).strfref(fmt)
+
+
+def price_grid(stop, step=None, fmt='%r ref', start=0):
+    """
+    a price ladder of strfref(fmt) strings from start up to stop in steps
+    of step, one weapon by default; stop, step and start are Metal values
+    or literals like '0.11ref' or '-2ref' (bare numbers are refined)
+    """
+    return list(_weapon_steps(_as_metal(start), _as_metal(stop), step, fmt))
+
+
+def set_exchange_rate(rate):
+    """
+    set the price of one key, as a Metal or a literal like '52.33ref'
+    (bare numbers are refined), None removes the rate; a rate that is not
+    positive and finite raises ValueError
+    """
+    global EXCHANGE_RATE
+    if rate is not None:
+        rate = _as_metal(rate)
+        if not _is_single_metal(rate) or isinstance(rate.weapon, float) or rate.weapon <= 0:
+            raise ValueError('Exchange rate must be a positive finite Metal')
+    EXCHANGE_RATE = rate
+    for price_list in list(_price_lists.values()):
+        price_list.reprice()
+
+
+def set_intern_limit(limit):
+    """
+    share one instance for every Metal between -limit and limit, as a Metal
+    or a literal like '100ref' (bare numbers are refined), None turns
+    interning off; a negative or infinite limit raises ValueError
+    """
+    global _intern_limit
+    if limit is None:
+        weapon = -1
     else:
-        raise ParserError('Bad Expression')
+        limit = _as_metal(limit)
+        if not _is_single_metal(limit) or isinstance(limit.weapon, float) or limit.weapon < 0:
+            raise ValueError('Intern limit must be a non-negative finite Metal')
+        weapon = limit.weapon
+    _intern_limit = weapon
+    _interned.clear()
 
 
-def calc(expr):
+def convert(expr):
+    ans = _convert_text(expr)
+    if ans.__class__ is KeyPrice:
+        return _key_price(ans)
+    return ans
+
+
+@lru_cache(maxsize=4096)
+@_decimal_context
+def _convert_text(expr):
+    # literal strings are parsed once, keys are priced by convert() so
+    # cached answers never depend on the exchange rate
+    tokens = list(tokenize(expr))
+    for token in tokens:
+        if token.kind != NUMBER and token.kind != UNIT:
+            raise ParserError('Bad Currency', token.pos)
+    if not tokens:
+        return D(''.join(expr.split()))
+    return _convert_literal(tokens)
+
+
+def _scan_pattern():
+    # one amount is a run of number and unit pairs on a single line, the
+    # number must not follow a word character, a dot or a comma and the
+    # unit must end the word, so 'x2ref', '1.2.3ref', '1,000ref' and
+    # '2refs' are not amounts; digits and units are ASCII only so 'ſcrap'
+    # or '٣ref' do not match
+    unit = '|'.join(sorted(units, key=len, reverse=True))
+    pair = rf'(?:{_number_re.pattern})[ \t]*(?:{unit})'
+    return rf'(?<![\w.,])(?a:{pair}(?:[ \t]*{pair})*)(?!\w)'
+
+
+_scan_re = re.compile(_scan_pattern(), re.IGNORECASE)
+_scan_bytes_re = re.compile(_scan_pattern().encode('ascii'), re.IGNORECASE)
+_scan_pair_re = re.compile(rf'({_number_re.pattern})[ \t]*([a-z]+)', re.ASCII)
+
+
+@lru_cache(maxsize=4096)
+@_decimal_context
+def _scan_literal(text):
+    # amounts are parsed by the same cached literal parser as convert()
+    values = []
+    for number, unit in _scan_pair_re.findall(text.lower()):
+        values.append(number)
+        values.append(unit)
+    if not values:
+        raise ParserError('Bad Currency')
+    return _parse_literal(tuple(values))
+
+
+def scan(text, keys=False):
+    """
+    lazily find every metal amount like '2.33 ref', '1rec 3 scrap' or
+    '5wep' in free text, yields (offset, Metal) pairs in order
+
+    text is a str, or bytes, bytearray, memoryview or mmap read in place,
+    offsets are indexes into text; amounts with keys are priced at the
+    current exchange rate when keys is true and skipped otherwise, as are
+    amounts too large to be a Metal
+    """
+    if isinstance(text, str):
+        matches = _scan_re.finditer(text)
+        decode = None
+    else:
+        matches = _scan_bytes_re.finditer(text)
+        decode = bytes.decode
+    for match in matches:
+        literal = match.group()
+        if decode is not None:
+            literal = decode(literal, 'ascii')
+        try:
+            metal = _scan_literal(literal)
+        except (ParserError, ValueError):
+            continue
+        if metal.__class__ is KeyPrice:
+            if not keys:
+                continue
+            metal = _key_price(metal)
+        yield match.start(), metal
+
+
+def lex(expr):
+    return list(tokenize(expr))
+
+
+class _Parser:
+
+    # precedence climbing over a token list, operator chains are parsed in a
+    # loop so only parens and unary operators recurse
+
+    def __init__(self, tokens, variables=False):
+        self.tokens = tokens
+        self.index = 0
+        self.variables = variables
+
+    def peek(self):
+        if self.index < len(self.tokens):
+            return self.tokens[self.index]
+        return None
+
+    def expression(self, min_precedence):
+        left = self.operand()
+        while True:
+            token = self.peek()
+            if token is None or token.value == ')':
+                return left
+            if token.kind != OPERATOR:
+                if token.value == '(':
+                    raise ParserError('Bad Expression', token.pos)
+                raise ParserError('Invalid Syntax', token.pos)
+            precedence = precedences[token.value]
+            if precedence < min_precedence:
+                return left
+            self.index += 1
+            right = self.expression(precedence + 1)
+            if left is None or right is None:
+                raise ParserError('Bad Expression', token.pos)
+            left = BinOp(token.value, left, right)
+
+    def operand(self):
+        token = self.peek()
+        if token is None:
+            raise ParserError('Bad Expression')
+        kind = token.kind
+        if kind == NUMBER or kind == UNIT:
+            start = self.index
+            end = start + 1
+            tokens = self.tokens
+            while end < len(tokens) and (tokens[end].kind == NUMBER or tokens[end].kind == UNIT):
+                end += 1
+            self.index = end
+            if self.variables and end == start + 1 and _is_variable(token.value):
+                return Var(token.value, token.pos)
+            return _convert_literal(tokens[start:end])
+        if kind == OPERATOR:
+            if token.value not in unary_operations:
+                raise ParserError('Bad Expression', token.pos)
+            self.index += 1
+            operand = self.operand()
+            if operand is None:
+                raise ParserError('Bad Expression', token.pos)
+            return UnaryOp(token.value, operand)
+        if token.value == ')':
+            raise ParserError('Bad Expression', token.pos)
+        self.index += 1
+        if self.peek() is None:
+            raise ParserError('Paren Mismatch', token.pos)
+        if self.peek().value == ')':
+            # empty parens, only meaningful as the whole expression
+            self.index += 1
+            return None
+        node = self.expression(1)
+        if self.peek() is None:
+            raise ParserError('Paren Mismatch', token.pos)
+        self.index += 1
+        return node
+
+
+def _is_variable(value):
+    # a lone word that is not a unit, names are lowercase like all units
+    return value not in units and value.isidentifier()
+
+
+def parse(tokens, variables=False):
+    if not tokens:
+        return None
+    parser = _Parser(tokens, variables)
+    node = parser.expression(1)
+    token = parser.peek()
+    if token is not None:
+        raise ParserError('Paren Mismatch', token.pos)
+    return node
+
+
+@_decimal_context
+def evaluate(node, bindings=None):
+    if isinstance(node, list):
+        # a token list straight from lex()
+        node = parse(node, bindings is not None)
+    return _evaluate(node, bindings)
+
+
+def _evaluate(node, bindings):
+    # iterative post-order walk, long operator chains build deep trees
+    if node is None:
+        return None
+    values = []
+    stack = [(node, False)]
+    while stack:
+        node, ready = stack.pop()
+        cls = node.__class__
+        if cls is BinOp:
+            if ready:
+                right = values.pop()
+                values[-1] = operations[node.op](values[-1], right)
+            else:
+                stack.append((node, True))
+                stack.append((node.right, False))
+                stack.append((node.left, False))
+        elif cls is UnaryOp:
+            if ready:
+                values[-1] = unary_operations[node.op](values[-1])
+            else:
+                stack.append((node, True))
+                stack.append((node.operand, False))
+        elif cls is KeyPrice:
+            values.append(_key_price(node))
+        elif cls is Var:
+            try:
+                values.append(bindings[node.name])
+            except (KeyError, TypeError):
+                raise ParserError('Unbound Variable', node.pos)
+        elif isinstance(node, (D, Metal)):
+            values.append(node)
+        else:
+            raise TypeError(f'Can not evaluate {cls.__name__}')
+    return values[0]
+
+
+def _variables(node):
+    # names of the Var nodes in order of first appearance
+    names = {}
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        cls = node.__class__
+        if cls is BinOp:
+            stack.append(node.right)
+            stack.append(node.left)
+        elif cls is UnaryOp:
+            stack.append(node.operand)
+        elif cls is Var:
+            names.setdefault(node.name)
+    return tuple(names)
+
+
+def _binding_value(value):
+    # bound values read like literals: strings through convert(), plain
+    # numbers as Decimal
+    if np is not None and isinstance(value, np.generic):
+        value = value.item()
+    if value.__class__ is str:
+        return convert(value)
+    if value.__class__ is int or value.__class__ is float:
+        return D(value, _context)
+    return value
+
+
+@contextmanager
+def _calc_errors():
     try:
-        ans = evaluate(lex(expr))
-        if isinstance(ans, D):
-            ans = normalize(ans.quantize(D('.01')))
+        with decimal.localcontext(_context):
+            yield
     except decimal.InvalidOperation:
         raise ParserError('Precision Overflow')
     except decimal.DivisionByZero:
         raise ParserError('Division by Zero')
-    except TypeError:
+    except (TypeError, ValueError):
         raise ParserError('Meaningless Operation')
+
+
+class Expression:
+
+    # a parsed expression that can be evaluated any number of times, when
+    # variables are allowed lone words that are not units become Var nodes
+    # bound at evaluation time
+
+    def __init__(self, expr, variables=False):
+        self.expr = expr
+        with _calc_errors():
+            self.node = parse(lex(expr), variables)
+        self.variables = _variables(self.node)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.expr!r})'
+
+    def evaluate(self, bindings=None, **kwargs):
+        if self.variables:
+            bindings = dict(bindings or (), **kwargs)
+            bindings = {name: _binding_value(bindings[name]) for name in self.variables if name in bindings}
+        with _calc_errors():
+            return _normalize_answer(_evaluate(self.node, bindings))
+
+    def evaluate_many(self, rows):
+        """
+        evaluate once per row of bindings, rows is a sequence of mappings or
+        a mapping of equal-length columns; answers come back in row order
+        with a failed row's exception in its place
+
+        columns of finite Metal (or a MetalArray) and ints are evaluated
+        once over the whole column with MetalArray arithmetic when numpy is
+        available, any other input runs the tree per row
+        """
+        if isinstance(rows, Mapping):
+            columns = rows
+            lengths = {len(columns[name]) for name in self.variables if name in columns}
+            if len(lengths) > 1:
+                raise ValueError('Columns must have the same length')
+            answers = self.__evaluate_columns(columns, lengths.pop() if lengths else 0)
+            if answers is not None:
+                return answers
+            names = [name for name in self.variables if name in columns]
+            rows = [dict(zip(names, values)) for values in zip(*[columns[name] for name in names])]
+        answers = []
+        node = self.node
+        variables = self.variables
+        with decimal.localcontext(_context):
+            for row in rows:
+                try:
+                    bindings = {name: _binding_value(row[name]) for name in variables if name in row}
+                    answers.append(_normalize_answer(_evaluate(node, bindings)))
+                except ParserError as e:
+                    answers.append(e)
+                except decimal.InvalidOperation:
+                    answers.append(ParserError('Precision Overflow'))
+                except decimal.DivisionByZero:
+                    answers.append(ParserError('Division by Zero'))
+                except (TypeError, ValueError):
+                    answers.append(ParserError('Meaningless Operation'))
+                except Exception as e:
+                    answers.append(e)
+        return answers
+
+    def __evaluate_columns(self, columns, length):
+        # None when some column or operation has no exact vector form
+        if not self.variables or not length:
+            return None
+        try:
+            _import_numpy()
+        except ImportError:
+            return None
+        bindings = {}
+        for name in self.variables:
+            if name not in columns:
+                return None
+            vector = _vector_column(columns[name])
+            if vector is None:
+                return None
+            bindings[name] = vector
+        try:
+            with decimal.localcontext(_context):
+                answer = _evaluate(self.node, bindings)
+        except Exception:
+            return None
+        if not isinstance(answer, MetalArray) or len(answer) != length:
+            return None
+        return answer.tolist()
+
+
+def _normalize_answer(ans):
+    if isinstance(ans, D):
+        ans = normalize(ans.quantize(D('.01'), context=_context))
+    return ans
+
+
+def compile(expr):
+    """
+    parse expr once for repeated evaluation, lone words that are not units
+    are variables, e.g. compile('price * qty - fee').evaluate(price='2ref',
+    qty=3, fee='1scrap')
+    """
+    return Expression(expr, variables=True)
+
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+class _LRUCache:
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.__data = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.__lock:
+            try:
+                value = self.__data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self.__data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self.__lock:
+            if self.maxsize <= 0:
+                return
+            self.__data[key] = value
+            self.__data.move_to_end(key)
+            while len(self.__data) > self.maxsize:
+                self.__data.popitem(last=False)
+
+    def resize(self, maxsize):
+        with self.__lock:
+            self.maxsize = maxsize
+            while len(self.__data) > max(maxsize, 0):
+                self.__data.popitem(last=False)
+
+    def clear(self):
+        with self.__lock:
+            self.__data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        with self.__lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize, len(self.__data))
+
+
+_calc_cache = _LRUCache(4096)
+_missing = object()
+
+
+def _calc_key(expr):
+    key = ''.join(expr.split())
+    if 'key' in key.lower():
+        # answers in keys depend on the exchange rate as well
+        key = (key, EXCHANGE_RATE and EXCHANGE_RATE.weapon)
+    return key
+
+
+def calc(expr):
+    # results are Decimal, Metal, tuples of those or None, all immutable,
+    # so cached answers can be shared between callers
+    if _hooks:
+        return _calc_instrumented(expr)
+    key = _calc_key(expr)
+    ans = _calc_cache.get(key, _missing)
+    if ans is _missing:
+        ans = Expression(expr).evaluate()
+        _calc_cache.put(key, ans)
+    return ans
+
+
+def _calc_instrumented(expr):
+    emit = _emit
+    emit('call', None)
+    key = _calc_key(expr)
+    ans = _calc_cache.get(key, _missing)
+    if ans is not _missing:
+        emit('cache_hit', None)
+        return ans
+    # Metals built by other code, or by other threads, are not counted
+    outer = getattr(_counting, 'active', False)
+    _counting.active = True
+    try:
+        with _calc_errors():
+            start = perf_counter()
+            tokens = lex(expr)
+            lexed = perf_counter()
+            emit('lex', lexed - start)
+            node = parse(tokens)
+            parsed = perf_counter()
+            emit('parse', parsed - lexed)
+            ans = evaluate(node)
+            evaluated = perf_counter()
+            emit('evaluate', evaluated - parsed)
+            ans = _normalize_answer(ans)
+            emit('normalize', perf_counter() - evaluated)
+    except ParserError as e:
+        emit('error', e.message)
+        raise
+    finally:
+        _counting.active = outer
+    _calc_cache.put(key, ans)
     return ans
 
 
+class CalcStats:
+
+    # collects calc() events, see instrument()
+
+    def __init__(self):
+        self.calls = 0
+        self.cache_hits = 0
+        self.metals = 0
+        self.stages = {}
+        self.errors = Counter()
+
+    def __call__(self, event, value):
+        if event == 'metal':
+            self.metals += 1
+        elif event == 'call':
+            self.calls += 1
+        elif event == 'cache_hit':
+            self.cache_hits += 1
+        elif event == 'error':
+            self.errors[value] += 1
+        else:
+            count, seconds = self.stages.get(event, (0, 0.0))
+            self.stages[event] = (count + 1, seconds + value)
+
+    def __repr__(self):
+        classname = self.__class__.__name__
+        return f'{classname}(calls={self.calls}, cache_hits={self.cache_hits}, metals={self.metals}, stages={self.stages}, errors={dict(self.errors)})'
+
+
+def _emit(event, value):
+    for hook in _hooks:
+        hook(event, value)
+
+
+def _counting_from_weapon(cls, weapon):
+    # a shared interned instance is only looked up, it is not counted
+    if getattr(_counting, 'active', False) and (cls is not Metal or weapon not in _interned):
+        _emit('metal', None)
+    return _metal_from_weapon(cls, weapon)
+
+
+def _timed_convert_literal(tokens):
+    if not getattr(_counting, 'active', False):
+        return _convert_literal_untimed(tokens)
+    start = perf_counter()
+    try:
+        return _convert_literal_untimed(tokens)
+    finally:
+        _emit('convert', perf_counter() - start)
+
+
+def add_hook(hook):
+    """
+    call hook(event, value) for every calc() pipeline event:
+
+    'call', 'cache_hit' - value is None
+    'lex', 'parse', 'convert', 'evaluate', 'normalize' - value is seconds
+        spent in the stage, 'convert' is part of 'parse'
+    'metal' - calc() built a new Metal object, value is None; reusing a
+        shared interned value does not count
+    'error' - value is the ParserError message or exception class name
+
+    the extra bookkeeping is only installed while a hook is registered
+    """
+    global _hooks, _convert_literal
+    with _hooks_lock:
+        if not _hooks:
+            Metal._from_weapon = classmethod(_counting_from_weapon)
+            _convert_literal = _timed_convert_literal
+        # replaced rather than changed, _emit may be iterating the old list
+        _hooks = _hooks + [hook]
+
+
+def remove_hook(hook):
+    global _hooks, _convert_literal
+    with _hooks_lock:
+        hooks = list(_hooks)
+        hooks.remove(hook)
+        _hooks = hooks
+        if not _hooks:
+            Metal._from_weapon = classmethod(_metal_from_weapon)
+            _convert_literal = _convert_literal_untimed
+
+
+@contextmanager
+def instrument():
+    stats = CalcStats()
+    add_hook(stats)
+    try:
+        yield stats
+    finally:
+        remove_hook(stats)
+
+
+_hooks = []
+_hooks_lock = threading.Lock()
+_counting = threading.local()
+_metal_from_weapon = Metal._from_weapon.__func__
+_convert_literal_untimed = _convert_literal
+
+
+def calc_cache_info():
+    return _calc_cache.info()
+
+
+def calc_cache_clear():
+    _calc_cache.clear()
+
+
+def set_calc_cache_size(maxsize):
+    _calc_cache.resize(maxsize)
+
+
 def calc_str(expr):
     try:
         return calc(expr)
     except ParserError as e:
         return 'Error: {}'.format(e.message)
     except Exception as e:
+        if _hooks:
+            _emit('error', e.__class__.__name__)
         return 'Error: {}'.format(e.__class__.__name__)
 
 
+def _calc_chunk(exprs):
+    answers = []
+    for expr in exprs:
+        try:
+            answers.append(calc(expr))
+        except Exception as e:
+            answers.append(e)
+    return answers
+
+
+def calc_many(exprs, workers=None, chunk_size=256):
+    """
+    calc() every expression on a pool of workers threads, answers come back
+    in input order and a failed expression gets its exception in place
+    """
+    exprs = list(exprs)
+    if workers is not None and workers <= 1:
+        return _calc_chunk(exprs)
+    from concurrent.futures import ThreadPoolExecutor
+    chunks = [exprs[i:i + chunk_size] for i in range(0, len(exprs), chunk_size)]
+    answers = []
+    with ThreadPoolExecutor(workers) as executor:
+        for chunk in executor.map(_calc_chunk, chunks):
+            answers.extend(chunk)
+    return answers
+
+
+def _init_color():
+    global colorama
+    try:
+        import colorama
+    except ImportError:
+        return False
+    colorama.init()
+    return True
+
+
 def _print_color(color, *args, **kw):
     args = list(args)
     if args:
@@ -588,6 +2938,165 @@ def _print_func(mode, *args, **kw):
         print(*args, **kw)
 
 
+def _format_answer(answer):
+    if isinstance(answer, Metal):
+        return answer.strfref('%rref')
+    elif isinstance(answer, D):
+        return '{}'.format(answer)
+    elif answer is None:
+        return ''
+    return '{}'.format(answer)
+
+
+def _calc_line(expr):
+    # (result, None) or (None, error message) for one input line
+    try:
+        return _format_answer(calc(expr)), None
+    except ParserError as e:
+        return None, e.message
+    except Exception as e:
+        return None, e.__class__.__name__
+
+
+def _run_batch(lines, out, json_lines=False, chunk_size=4096):
+    # one output line per input line, written in chunks so memory stays
+    # flat however long the input is
+    import json
+    chunk = []
+    push = chunk.append
+    for lineno, line in enumerate(lines, 1):
+        expr = line.rstrip('\r\n')
+        result, error = _calc_line(expr)
+        if json_lines:
+            if error is None:
+                push(json.dumps({'line': lineno, 'input': expr, 'result': result}))
+            else:
+                push(json.dumps({'line': lineno, 'input': expr, 'error': error}))
+        elif error is None:
+            push(result)
+        else:
+            push('Error: {} (line {})'.format(error, lineno))
+        if len(chunk) >= chunk_size:
+            chunk.append('')
+            out.write('\n'.join(chunk))
+            chunk.clear()
+    if chunk:
+        chunk.append('')
+        out.write('\n'.join(chunk))
+    out.flush()
+
+
+def _serve_answer(line):
+    # one response line per request line, a line starting with { is a JSON
+    # request {"expr": ..., "id": ...} and gets a JSON response
+    import json
+    text = line.decode('utf-8', 'replace').rstrip('\r\n')
+    if not text.lstrip().startswith('{'):
+        result, error = _calc_line(text)
+        if error is not None:
+            result = 'Error: {}'.format(error)
+        return result.encode('utf-8') + b'\n'
+    try:
+        request = json.loads(text)
+        expr = request['expr']
+        if not isinstance(expr, str):
+            raise TypeError
+    except (ValueError, KeyError, TypeError):
+        return b'{"error": "Bad Request"}\n'
+    result, error = _calc_line(expr)
+    response = {'id': request['id']} if 'id' in request else {}
+    if error is None:
+        response['result'] = result
+    else:
+        response['error'] = error
+    return json.dumps(response).encode('utf-8') + b'\n'
+
+
+async def _serve_connection(reader, writer, max_in_flight):
+    # requests are answered as they are read and queued for the writer, a
+    # full queue stops reading so a client that does not read its
+    # responses is throttled by TCP flow control
+    import asyncio
+    queue = asyncio.Queue(max_in_flight)
+
+    async def respond():
+        while True:
+            chunk = [await queue.get()]
+            while not queue.empty():
+                chunk.append(queue.get_nowait())
+            done = chunk[-1] is None
+            if done:
+                chunk.pop()
+            writer.write(b''.join(chunk))
+            await writer.drain()
+            if done:
+                return
+
+    async def put(answer):
+        # a responder that stopped on a write error never empties the
+        # queue again, so waiting for room also waits for the responder
+        if not queue.full():
+            queue.put_nowait(answer)
+            return True
+        putter = asyncio.ensure_future(queue.put(answer))
+        await asyncio.wait((putter, responder), return_when=asyncio.FIRST_COMPLETED)
+        if putter.done():
+            return True
+        putter.cancel()
+        return False
+
+    responder = asyncio.ensure_future(respond())
+    try:
+        while not responder.done():
+            try:
+                line = await reader.readline()
+            except ValueError:
+                await put(b'Error: Line Too Long\n')
+                break
+            if not line or not await put(_serve_answer(line)):
+                break
+        if not responder.done():
+            await put(None)
+        # raises the responder's error, if it had one
+        await responder
+    except (ConnectionError, asyncio.CancelledError):
+        # the client went away or the server is shutting down
+        pass
+    finally:
+        responder.cancel()
+        writer.close()
+
+
+async def start_server(host='127.0.0.1', port=8533, path=None, max_in_flight=64):
+    """
+    start an asyncio calc() server on host:port, or on a Unix socket when
+    path is given, and return the asyncio.Server
+
+    every request line gets one response line in request order, clients
+    may pipeline any number of requests; at most max_in_flight answered
+    requests wait per connection before reading pauses
+    """
+    import asyncio
+
+    def handle(reader, writer):
+        return _serve_connection(reader, writer, max_in_flight)
+
+    if path is not None:
+        return await asyncio.start_unix_server(handle, path)
+    return await asyncio.start_server(handle, host, port)
+
+
+def serve(host='127.0.0.1', port=8533, path=None, max_in_flight=64):
+    import asyncio
+
+    async def run():
+        server = await start_server(host, port, path, max_in_flight)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(run())
+
+
 def _term_handler(signal, frame):
     sys.exit(0)
 
@@ -597,23 +3106,57 @@ if __name__ == '__main__':
     import platform
     import signal
     signal.signal(signal.SIGINT, _term_handler)
-    if '--nocolor' in sys.argv:
-        COLOR = False
-    args = [a for a in sys.argv[1:] if not a.startswith('--') and a != '-']
+    argv = sys.argv[1:]
+    for a in argv:
+        if a.startswith('--key='):
+            set_exchange_rate(a[len('--key='):])
+    for a in argv:
+        if a == '--serve' or a.startswith('--serve='):
+            address = a[len('--serve='):] or '127.0.0.1:8533'
+            limit = [int(b[len('--max-in-flight='):]) for b in argv if b.startswith('--max-in-flight=')]
+            if address.startswith('unix:'):
+                serve(path=address[len('unix:'):], max_in_flight=limit[-1] if limit else 64)
+            else:
+                host, _, port = address.rpartition(':')
+                serve(host or '127.0.0.1', int(port), max_in_flight=limit[-1] if limit else 64)
+            sys.exit(0)
+    batch_file = None
+    if '--batch' in argv:
+        batch_file = '-'
+    if '-f' in argv:
+        index = argv.index('-f')
+        batch_file = argv[index + 1] if index + 1 < len(argv) else '-'
+        del argv[index:index + 2]
+    if batch_file is not None:
+        try:
+            if batch_file == '-':
+                _run_batch(sys.stdin, sys.stdout, '--json' in argv)
+            else:
+                with open(batch_file, encoding='utf-8') as f:
+                    _run_batch(f, sys.stdout, '--json' in argv)
+        except BrokenPipeError:
+            sys.stderr.close()
+        except OSError as e:
+            print('Error: {} ({})'.format(e.strerror or e.__class__.__name__, batch_file), file=sys.stderr)
+            sys.exit(1)
+        except UnicodeDecodeError:
+            print('Error: Bad Encoding ({})'.format(batch_file), file=sys.stderr)
+            sys.exit(1)
+        sys.exit(0)
+    args = [a for a in argv if not a.startswith('--') and a != '-']
     args = [a for a in args if not a.startswith('-') or len(a) != 2 or a[1] in '0123456789']
     if args:
         for expr in args:
             answer = calc_str(expr)
-            if isinstance(answer, Metal):
-                print(answer.strfref('%rref'))
-            elif isinstance(answer, D):
-                print('{}'.format(answer))
-            elif isinstance(answer, str):
+            if isinstance(answer, str):
                 print(answer)
+            elif answer is not None:
+                print(_format_answer(answer))
         sys.exit(0)
     if platform.system() == 'Windows' and getattr(sys, 'frozen', False):
         import ctypes
         ctypes.windll.kernel32.SetConsoleTitleW(tool_name)
+    COLOR = '--nocolor' not in sys.argv and _init_color()
     _print_func('title', '{} by deluxghost\nType "quit" to exit.\nType "help" to get more information.'.format(tool_name))
     while True:
         try:
@@ -629,6 +3172,7 @@ if __name__ == '__main__':
             _print_func(
                 'info',
                 'Use ref, rec, scrap or wep as metal unit.\n'
+                'Use key as well when started with --key=RATE.\n'
                 'Examples:'
             )
             _print_func('prompt', '>> ', end='')
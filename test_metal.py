@@ -0,0 +1,158 @@
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import metal
+from metal import Metal
+
+
+@pytest.mark.parametrize('expr, answer', [
+    ('10-3-2', '5'),
+    ('2-3+4', '3'),
+    ('1 / 3 * 3', '1'),
+    ('8 / 2 / 2', '2'),
+    ('2 + 3 * 4', '14'),
+    ('(2 + 3) * 4', '20'),
+    ('2*-3', '-6'),
+    ('--2', '2'),
+    ('-2ref', '-2 ref'),
+    ('-(2ref)', '-2 ref'),
+    ('+2ref', '2 ref'),
+])
+def test_precedence_and_unary(expr, answer):
+    assert str(metal.calc(expr)) == answer
+
+
+@pytest.mark.parametrize('expr, message', [
+    ('(1)2', 'Error: Invalid Syntax'),
+    ('2 ** 3', 'Error: Bad Expression'),
+    ('(1 + 2', 'Error: Paren Mismatch'),
+])
+def test_syntax_errors(expr, message):
+    assert metal.calc_str(expr) == message
+
+
+@pytest.mark.parametrize('expr, answer', [
+    ('(2.33ref1rec * 3 + 3scrap) / 2', '4.16 ref'),
+    ('2.55ref*4', '10.22 ref'),
+    ('1ref/3', '0.33 ref'),
+    ('5ref - 2.33ref', '2.66 ref'),
+    ('1ref + 1scrap*3', '1.33 ref'),
+    ('0.11ref * 3', '0.33 ref'),
+    ('1.33ref / 4', '0.33 ref'),
+])
+def test_rounding_matches_baseline(expr, answer):
+    assert str(metal.calc(expr)) == answer
+
+
+@pytest.mark.parametrize('args, scrap', [
+    (('0.05', '0', '0', '1'), '1.0'),
+    (('-44.66', '0', '-0.5', '-1'), '-403.0'),
+    (('-44.66',), '-402'),
+    (('0', '0', '0', '2.0'), '1'),
+    (('0', '0', '0', '3'), '1.5'),
+    (('1.5',), '13.5'),
+])
+def test_scrap_form_matches_baseline(args, scrap):
+    assert str(Metal(*args).scrap) == scrap
+
+
+def test_batch_file_errors(tmp_path):
+    script = os.path.join(os.path.dirname(os.path.abspath(metal.__file__)), 'metal.py')
+    bad = tmp_path / 'bad.txt'
+    bad.write_bytes(b'1ref\n\xff\n')
+    for path, message in [(tmp_path / 'missing.txt', 'No such file or directory'), (tmp_path, 'Is a directory'), (bad, 'Bad Encoding')]:
+        result = subprocess.run([sys.executable, script, '-f', str(path)], capture_output=True, text=True)
+        assert result.returncode == 1
+        assert result.stderr == 'Error: {} ({})\n'.format(message, path)
+
+
+def test_instrument_counts_calc_only():
+    metal.calc_cache_clear()
+    with metal.instrument() as stats:
+        Metal('5000.11')
+        thread = threading.Thread(target=Metal, args=('6000.22',))
+        thread.start()
+        thread.join()
+        assert stats.metals == 0
+        metal.calc('5000ref + 1.11ref')
+    assert stats.calls == 1
+    assert stats.metals > 0
+    assert stats.stages['convert'][0] == 2
+    assert not metal._hooks
+
+
+def test_range_metal_array_tuples():
+    pytest.importorskip('numpy')
+    m = Metal('2')
+    ranges = metal.RangeMetalArray([(m, m), (Metal('3'), Metal('1'))])
+    assert list(ranges.start) == [m, Metal('1')]
+    assert list(ranges.end) == [m, Metal('3')]
+    with pytest.raises(TypeError):
+        metal.RangeMetalArray([(m, 'x')])
+
+
+class _Reader:
+
+    async def readline(self):
+        await asyncio.sleep(0)
+        return b'1ref + 1rec\n'
+
+
+class _BrokenWriter:
+
+    closed = False
+
+    def write(self, data):
+        pass
+
+    async def drain(self):
+        await asyncio.sleep(0.05)
+        raise ConnectionResetError
+
+    def close(self):
+        self.closed = True
+
+
+def test_serve_connection_stops_on_write_error():
+    async def run():
+        writer = _BrokenWriter()
+        task = asyncio.ensure_future(metal._serve_connection(_Reader(), writer, 4))
+        done, _ = await asyncio.wait({task}, timeout=2)
+        task.cancel()
+        return bool(done), writer.closed
+
+    assert asyncio.run(run()) == (True, True)
+
+
+@pytest.mark.parametrize('text, found', [
+    ('sell 2.33 ref, buy 1rec 3 scrap', [(5, '2.33 ref'), (19, '0.66 ref')]),
+    ('price 99999999999999999999999 ref or 2 ref', [(37, '2 ref')]),
+    ('2 refİned 3 ref', [(10, '3 ref')]),
+    ('2 ſcrap', []),
+    ('1,000 ref', []),
+    ('x2ref 1.2.3ref 2refs', []),
+])
+def test_scan(text, found):
+    assert [(offset, str(m)) for offset, m in metal.scan(text)] == found
+    if text.isascii():
+        assert [(offset, str(m)) for offset, m in metal.scan(text.encode())] == found
+
+
+def test_signed_literals():
+    assert metal.price_grid('-1ref', step='0.33ref', start='-2ref') == metal.price_grid(-Metal('1'), step=Metal('0.33'), start=-Metal('2'))
+    with pytest.raises(ValueError):
+        metal.set_exchange_rate('-5ref')
+    with pytest.raises(ValueError):
+        metal.set_intern_limit('-1ref')
+
+
+def test_pandas_dtype_registered():
+    pd = pytest.importorskip('pandas')
+    metal.register_pandas()
+    values = pd.Series(['1ref', '-0.33ref', '2rec'], dtype='metal')
+    assert str(values.sum()) == '1.33 ref'